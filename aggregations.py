@@ -0,0 +1,183 @@
+"""One-pass aggregation engine for the dashboard charts.
+
+Every dimension the charts group by (Region, Segment, Category, Sub-Category
+and the order month) is integer-coded once per dataset. Per rerun, the
+filtered rows are reduced in a single bincount pass over the combined code
+into a small cube of (dimensions -> Sales/Profit/Quantity/Count) cells, and
+every chart and table is then derived from that cube. The cost per rerun is
+one pass over the filtered rows plus work proportional to the number of
+groups, instead of one scan of the rows per chart. Large selections are
+reduced across a process pool (block_reduce.py), with the same result.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from block_reduce import reduce_rows
+from filter_index import category_codes
+from incremental import extended
+from time_buckets import LABEL_COLUMNS, TimeBuckets
+
+DIMENSIONS = ('Region', 'Segment', 'Category', 'Sub-Category')
+MEASURES = ('Sales', 'Profit', 'Quantity')
+MONTH = 'month'
+# month first in the combined cell key, so adding later months keeps existing keys valid
+KEY_DIMENSIONS = (MONTH,) + DIMENSIONS
+
+# Dense bincount over the full key space up to this many cells; sparser
+# combinations fall back to np.unique on the keys actually present.
+MAX_DENSE_CELLS = 1 << 22
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June', 'July',
+               'August', 'September', 'October', 'November', 'December']
+
+
+class CodedColumns:
+    """Integer codes for the grouping dimensions and float measures of a dataset.
+
+    Missing labels get their own trailing code so a row with, say, no Segment
+    still counts towards the Category totals.
+    """
+
+    def __init__(self, frame, months=None):
+        self.codes = {}
+        self.labels = {}
+        for dimension in DIMENSIONS:
+            codes, labels = category_codes(frame[dimension])
+            codes = codes.astype(np.int64)
+            codes[codes < 0] = len(labels)
+            self.codes[dimension] = codes
+            self.labels[dimension] = labels
+
+        self.months = months if months is not None else TimeBuckets(frame['Order Date'], 'Month')
+        self.codes[MONTH] = self.months.codes
+        self.labels[MONTH] = list(range(self.months.n))
+
+        self.measures = {measure: frame[measure].to_numpy(dtype=np.float64) for measure in MEASURES}
+        # the combined cell of every row, so a rerun gathers one column instead of five
+        self.keys = self._keys(self.codes)
+
+    @classmethod
+    def for_dataset(cls, dataset):
+        columns = list(DIMENSIONS) + list(MEASURES)
+        months = TimeBuckets.for_dataset(dataset, 'Month')
+        return dataset.derive('coded_columns', lambda d: cls(d.select(columns), months))
+
+    def shape(self):
+        # one extra slot per dimension for missing values
+        return tuple(len(self.labels[dimension]) + 1 for dimension in KEY_DIMENSIONS)
+
+    def _keys(self, codes):
+        return np.ravel_multi_index([codes[dimension] for dimension in KEY_DIMENSIONS], self.shape()).astype(np.int64, copy=False)
+
+    def extended(self, frame, months):
+        """These columns with frame's rows appended, given the Month buckets extended to them.
+
+        Returns None when frame brings a label the columns have not seen.
+        """
+        codes = {}
+        for dimension in DIMENSIONS:
+            labels = self.labels[dimension]
+            # -1 for missing values and for labels the columns have not seen
+            dimension_codes = pd.Index(labels).get_indexer(frame[dimension]).astype(np.int64)
+            if ((dimension_codes < 0) & frame[dimension].notna().to_numpy()).any():
+                return None
+            dimension_codes[dimension_codes < 0] = len(labels)
+            codes[dimension] = dimension_codes
+        codes[MONTH] = months.codes[len(self.keys):]
+
+        coded = copy.copy(self)
+        coded.months = months
+        coded.labels = dict(self.labels, **{MONTH: list(range(months.n))})
+        coded.codes = {dimension: extended(self.codes[dimension], codes[dimension]) for dimension in DIMENSIONS}
+        coded.codes[MONTH] = months.codes
+        coded.measures = {measure: extended(self.measures[measure], frame[measure].to_numpy(dtype=np.float64)) for measure in MEASURES}
+        coded.keys = extended(self.keys, coded._keys(codes))
+        return coded
+
+
+def aggregate(coded, rows=slice(None), workers=None):
+    """Reduce the given rows (slice or position array) to an Aggregates cube.
+
+    workers is passed to block_reduce.reduce_rows: None decides by the size
+    of the selection, 1 forces the serial path.
+    """
+    dimensions = KEY_DIMENSIONS
+    shape = coded.shape()
+    dense = np.prod(shape, dtype=np.float64) <= MAX_DENSE_CELLS
+    cells = int(np.prod(shape)) if dense else None
+    present, counts, sums = reduce_rows(coded.keys, [coded.measures[measure] for measure in MEASURES], rows, cells, dense, workers)
+
+    cube = dict(zip(dimensions, np.unravel_index(present, shape)))
+    cube.update(zip(MEASURES, sums))
+    cube['Count'] = counts
+    return Aggregates(coded, pd.DataFrame(cube), rows)
+
+
+class Aggregates:
+    """The aggregated cube for one filter state, with one method per chart input."""
+
+    def __init__(self, coded, cube, rows=slice(None)):
+        self.coded = coded
+        self.cube = cube
+        self.rows = rows
+
+    def _labelled(self, frame, dimensions):
+        """Replace dimension codes with their labels, dropping the missing-value slot."""
+        for dimension in dimensions:
+            if dimension == MONTH:
+                continue
+            labels = self.coded.labels[dimension]
+            frame = frame[frame[dimension] < len(labels)]
+            frame = frame.assign(**{dimension: np.asarray(labels, dtype=object)[frame[dimension].to_numpy()]})
+        return frame
+
+    def by(self, dimensions, measures=('Sales',)):
+        """Sum of measures per combination of dimensions, like groupby(...).sum()."""
+        dimensions = list(dimensions)
+        grouped = self.cube.groupby(dimensions, as_index=False, sort=True)[list(measures) + ['Count']].sum()
+        grouped = self._labelled(grouped, dimensions)
+        return grouped.drop(columns='Count').reset_index(drop=True)
+
+    def category_sales(self):
+        return self.by(['Category'])
+
+    def region_sales(self):
+        return self.by(['Region'])
+
+    def segment_sales(self):
+        return self.by(['Segment'])
+
+    def hierarchy_sales(self):
+        """Sales per Region / Category / Sub-Category, the treemap hierarchy."""
+        return self.by(['Region', 'Category', 'Sub-Category'])
+
+    def monthly_sales(self):
+        """Sales per order month in calendar order, labelled like '2015 : Jan'."""
+        grouped = self.cube.groupby(MONTH, as_index=False, sort=True)['Sales'].sum()
+        grouped = grouped[grouped[MONTH] < len(self.coded.labels[MONTH])]
+        return pd.DataFrame({
+            LABEL_COLUMNS['Month']: self.coded.months.labels(grouped[MONTH].to_numpy()),
+            'Sales': grouped['Sales'].to_numpy(),
+        })
+
+    def time_series(self, buckets):
+        """Sales per time bucket; monthly buckets come straight from the cube."""
+        if buckets.granularity == 'Month':
+            return self.monthly_sales()
+        return buckets.series(self.rows, self.coded.measures['Sales'])
+
+    def subcategory_month_sales(self):
+        """Mean Sales per row, Sub-Category x month name (the old pivot_table)."""
+        cube = self.cube[self.cube[MONTH] < len(self.coded.labels[MONTH])]
+        month_number = (cube[MONTH].to_numpy() + self.coded.months.first) % 12
+        grouped = cube.assign(Month=month_number).groupby(['Sub-Category', 'Month'], as_index=False)[['Sales', 'Count']].sum()
+        grouped = self._labelled(grouped, ['Sub-Category'])
+        grouped['Sales'] = grouped['Sales'] / grouped['Count']
+        pivot = grouped.pivot(index='Sub-Category', columns='Month', values='Sales')
+        pivot.columns = [MONTH_NAMES[month] for month in pivot.columns]
+        pivot.columns.name = 'Month'
+        pivot.index = pivot.index.astype(str)
+        return pivot
@@ -0,0 +1,73 @@
+"""Date-range filtering: boolean masks + copy vs. binary search on sorted dates.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_date_slice --sizes 10k 1M 10M
+
+For each size, random Start/End date pairs are filtered both ways and the
+median time per lookup is reported, together with the one-off DateIndex
+build time.
+"""
+
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import SIZES, make_superstore
+from date_index import DateIndex
+
+CHART_COLUMNS = ['Order Date', 'Region', 'State', 'City', 'Segment', 'Category', 'Sub-Category', 'Sales', 'Quantity', 'Profit']
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def mask_filter(df, date1, date2):
+    # what dashboard.py did before DateIndex
+    return df[(df['Order Date'] >= date1) & (df['Order Date'] <= date2)].copy()
+
+
+def index_filter(df, date_index, date1, date2):
+    return df.iloc[date_index.window(date1, date2)]
+
+
+def run(n_rows, repeat, seed):
+    df = make_superstore(n_rows, seed=seed, columns=CHART_COLUMNS)
+    build, date_index = timed(DateIndex, df['Order Date'])
+    rng = np.random.default_rng(seed)
+    days = (date_index.max - date_index.min).days
+    masks, slices = [], []
+    for _ in range(repeat):
+        lo, hi = np.sort(rng.integers(0, days + 1, 2))
+        date1 = date_index.min + np.timedelta64(int(lo), 'D')
+        date2 = date_index.min + np.timedelta64(int(hi), 'D')
+        mask_time, expected = timed(mask_filter, df, date1, date2)
+        slice_time, got = timed(index_filter, df, date_index, date1, date2)
+        assert len(expected) == len(got)
+        masks.append(mask_time)
+        slices.append(slice_time)
+    return {
+        'rows': n_rows,
+        'index_build_ms': build * 1e3,
+        'mask_copy_ms': statistics.median(masks) * 1e3,
+        'searchsorted_ms': statistics.median(slices) * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=list(SIZES), choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=20, help='date ranges per size')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    print(json.dumps([run(SIZES[size], args.repeat, args.seed) for size in args.sizes], indent=2))
+
+
+if __name__ == '__main__':
+    main()
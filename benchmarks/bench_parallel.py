@@ -0,0 +1,76 @@
+"""Scaling of the aggregation stage across 1..N worker processes.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_parallel --sizes 1M 10M --workers 1 2 4 8
+
+For each size, the whole dataset and a random half of its rows are reduced
+with each worker count (1 is the serial path), after a warm-up call that
+starts the pool and copies the columns into shared memory. Every cube is
+checked to be bit-identical to the serial one, and the median time per call
+is reported with the speedup over serial.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+
+import numpy as np
+
+from aggregations import DIMENSIONS, MEASURES, CodedColumns, aggregate
+from benchmarks.synthetic import SIZES, make_superstore
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def identical(a, b):
+    """Same cells with bit-for-bit equal values."""
+    return a.columns.equals(b.columns) and all(
+        np.array_equal(a[column].to_numpy().view(np.uint8), b[column].to_numpy().view(np.uint8)) for column in a.columns)
+
+
+def run(n_rows, workers, repeat, seed):
+    df = make_superstore(n_rows, seed=seed, columns=['Order Date', *DIMENSIONS, *MEASURES])
+    build, coded = timed(CodedColumns, df)
+    rng = np.random.default_rng(seed)
+    selections = {
+        'all': slice(None),
+        'half': np.sort(rng.choice(n_rows, n_rows // 2, replace=False)),
+    }
+    results = {}
+    for name, rows in selections.items():
+        serial = aggregate(coded, rows, workers=1).cube
+        timings = {}
+        for count in workers:
+            aggregate(coded, rows, workers=count)
+            samples = []
+            for _ in range(repeat):
+                elapsed, result = timed(aggregate, coded, rows, workers=count)
+                if not identical(serial, result.cube):
+                    raise AssertionError(f'{count} workers differ from the serial cube ({name}, {n_rows} rows)')
+                samples.append(elapsed)
+            timings[count] = statistics.median(samples)
+        results[name] = {str(count): {'ms': seconds * 1e3, 'speedup': timings[1] / seconds if 1 in timings else None}
+                         for count, seconds in timings.items()}
+    return {'rows': n_rows, 'coded_columns_ms': build * 1e3, 'selections': results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['1M', '10M'], choices=list(SIZES))
+    parser.add_argument('--workers', nargs='+', type=int, default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per worker count')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    workers = sorted(set(args.workers) | {1})
+    print(json.dumps({'cpus': os.cpu_count(), 'sizes': [run(SIZES[size], workers, args.repeat, args.seed) for size in args.sizes]}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
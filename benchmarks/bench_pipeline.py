@@ -0,0 +1,266 @@
+"""Headless benchmark of dashboard reruns on synthetic Superstore data.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_pipeline --sizes 10k 1M --out bench.json
+
+For each size a synthetic CSV is written, then a fresh interpreter measures:
+
+* stages: every pipeline stage (load, date and Region/State/City filters,
+  each aggregation, each figure build, each CSV export) over --repeat random
+  filter choices, as latency percentiles, plus the tracemalloc peak of one
+  call of each stage;
+* reruns: every recorded widget sequence in benchmarks/sequences replayed
+  through Streamlit's AppTest against --app, as latency percentiles per step;
+* peak_rss_mb: the peak resident memory of that interpreter.
+
+Results are JSON tagged with the git commit, so runs can be compared between
+commits.
+"""
+
+import argparse
+import datetime
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import pipeline
+from benchmarks.synthetic import SIZES, make_superstore, write_csv
+from data_loader import clear_cache
+from exports import frame_csv, iter_csv_chunks
+from time_buckets import GRANULARITIES, TimeBuckets
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEQUENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sequences')
+PERCENTILES = (50, 90, 99)
+
+
+def _pick(rng, options, most=2):
+    """Nothing (half of the time) or up to most random options."""
+    if not options or rng.random() < 0.5:
+        return []
+    picks = rng.choice(len(options), min(len(options), int(rng.integers(1, most + 1))), replace=False)
+    return [options[i] for i in picks]
+
+
+def random_choice(dataset, rng):
+    """Widget values of one simulated rerun."""
+    dates = pipeline.date_index(dataset)
+    days = (dates.max - dates.min).days
+    lo, hi = np.sort(rng.integers(0, days + 1, 2))
+    start = dates.min + pd.Timedelta(days=int(lo))
+    end = dates.min + pd.Timedelta(days=int(hi))
+    window = dates.window(start, end)
+    index = pipeline.filter_index(dataset)
+    region = _pick(rng, index.options('Region', window=window))
+    state = _pick(rng, index.options('State', region=region, window=window))
+    city = _pick(rng, index.options('City', region=region, state=state, window=window))
+    return {'start': start, 'end': end, 'region': region, 'state': state, 'city': city,
+            'granularity': GRANULARITIES[int(rng.integers(len(GRANULARITIES)))]}
+
+
+def _drain(chunks):
+    return sum(len(chunk) for chunk in chunks)
+
+
+def rerun(dataset, choice, measure):
+    """The stages of one dashboard rerun; measure(name, fn, *args) calls and records each one."""
+    window = measure('date_window', pipeline.date_window, dataset, choice['start'], choice['end'])
+    rows = measure('location_rows', pipeline.location_rows, dataset, choice['region'], choice['state'], choice['city'], window)
+    aggregates = measure('aggregate', pipeline.aggregate_rows, dataset, rows)
+    category_df = measure('category_sales', aggregates.category_sales)
+    region_df = measure('region_sales', aggregates.region_sales)
+    segment_df = measure('segment_sales', aggregates.segment_sales)
+    hierarchy_df = measure('hierarchy_sales', aggregates.hierarchy_sales)
+    linechart = measure('time_series', pipeline.time_series, dataset, aggregates, choice['granularity'])
+    measure('subcategory_month_sales', aggregates.subcategory_month_sales)
+
+    measure('category_bar', pipeline.category_bar, category_df)
+    measure('region_pie', pipeline.region_pie, region_df)
+    measure('time_series_line', pipeline.time_series_line, linechart, choice['granularity'])
+    measure('treemap', pipeline.treemap, hierarchy_df)
+    measure('segment_pie', pipeline.segment_pie, segment_df)
+    measure('category_pie', pipeline.category_pie, category_df)
+    measure('summary_table', pipeline.summary_table, dataset, window)
+    measure('scatter', pipeline.scatter, dataset, rows)
+
+    measure('export_category', frame_csv, category_df)
+    measure('export_time_series', frame_csv, linechart)
+    measure('export_rows', _drain, iter_csv_chunks(dataset.table, window))
+
+
+def summarize(samples):
+    """Latency percentiles in milliseconds per name."""
+    summary = {}
+    for name, values in samples.items():
+        values = np.asarray(values) * 1e3
+        summary[name] = dict({f'p{p}_ms': float(np.percentile(values, p)) for p in PERCENTILES},
+                             mean_ms=float(values.mean()), n=len(values))
+    return summary
+
+
+def bench_stages(csv_path, repeat, seed):
+    samples = {}
+
+    def timed(name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        samples.setdefault(name, []).append(time.perf_counter() - start)
+        return result
+
+    # parse + snapshot write, then snapshot-only loads as a fresh process would see them
+    dataset = timed('load_csv', pipeline.load, csv_path)
+    for _ in range(repeat):
+        clear_cache()
+        dataset = timed('load_snapshot', pipeline.load, csv_path)
+    # one-off, per-dataset structures the stages below reuse
+    timed('build_date_index', pipeline.date_index, dataset)
+    timed('build_filter_index', pipeline.filter_index, dataset)
+    timed('build_coded_columns', pipeline.coded_columns, dataset)
+    for granularity in GRANULARITIES:
+        timed(f'build_time_buckets_{granularity.lower()}', TimeBuckets.for_dataset, dataset, granularity)
+
+    rng = np.random.default_rng(seed)
+    choices = [random_choice(dataset, rng) for _ in range(repeat)]
+    for choice in choices:
+        rerun(dataset, choice, timed)
+    summary = summarize(samples)
+
+    def traced(name, fn, *args):
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn(*args)
+        summary[name]['peak_alloc_mb'] = (tracemalloc.get_traced_memory()[1] - before) / 1024 ** 2
+        return result
+
+    tracemalloc.start()
+    try:
+        rerun(dataset, choices[0], traced)
+    finally:
+        tracemalloc.stop()
+    return dataset, summary
+
+
+def _widget(at, step):
+    widgets = getattr(at, step['widget'])
+    if 'key' in step:
+        return widgets(key=step['key'])
+    for widget in widgets:
+        if widget.label == step['label']:
+            return widget
+    raise LookupError(f"no {step['widget']} labelled {step['label']!r}")
+
+
+def replay(app, sequence, repeat):
+    """Run the steps of a recorded sequence through AppTest, timing each rerun."""
+    from streamlit.testing.v1 import AppTest
+
+    samples = {}
+    for _ in range(repeat):
+        at = AppTest.from_file(app, default_timeout=600)
+        expanders, opened = set(), set()
+        for step in sequence['steps']:
+            expanders.update(step.get('open', ()), step.get('close', ()))
+            opened.update(step.get('open', ()))
+            opened.difference_update(step.get('close', ()))
+            # AppTest does not keep expander state between runs
+            for key in expanders:
+                at.session_state[key] = key in opened
+            if 'widget' in step:
+                value = step['value']
+                if step['widget'] == 'date_input':
+                    value = datetime.date.fromisoformat(value)
+                _widget(at, step).set_value(value)
+            start = time.perf_counter()
+            at.run()
+            samples.setdefault(step['name'], []).append(time.perf_counter() - start)
+            if at.exception:
+                raise RuntimeError(f"step {step['name']!r}: {at.exception[0].message}")
+    return summarize(samples)
+
+
+def load_sequences(names=None):
+    sequences = {}
+    for path in sorted(glob.glob(os.path.join(SEQUENCE_DIR, '*.json'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        if names is None or name in names:
+            with open(path) as f:
+                sequences[name] = json.load(f)
+    return sequences
+
+
+def child(csv_path, args):
+    dataset, stages = bench_stages(csv_path, args.repeat, args.seed)
+    reruns = {name: replay(os.path.join(REPO_DIR, args.app), sequence, args.replay_repeat)
+              for name, sequence in load_sequences(args.sequences).items()}
+    print(json.dumps({
+        'rows': len(dataset),
+        'stages': stages,
+        'reruns': reruns,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }))
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR, check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['10k', '1M'], choices=list(SIZES))
+    parser.add_argument('--repeat', type=int, default=20, help='simulated reruns per size')
+    parser.add_argument('--replay-repeat', type=int, default=3, help='replays of each recorded sequence')
+    parser.add_argument('--sequences', nargs='+', help='names of the sequences to replay (default: all)')
+    parser.add_argument('--app', default='dashboard.py', help='dashboard script to replay against')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the JSON here instead of printing it')
+    parser.add_argument('--child', metavar='CSV', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.child, args)
+        return
+
+    results = {
+        'commit': git_commit(),
+        'python': sys.version.split()[0],
+        'args': {'repeat': args.repeat, 'replay_repeat': args.replay_repeat, 'seed': args.seed, 'app': args.app},
+        'sizes': {},
+    }
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, f'superstore_{size}.csv')
+            write_csv(make_superstore(SIZES[size], seed=args.seed), csv_path)
+            # the child (and the dashboard it replays) load this file through the normal loader
+            env = dict(os.environ, SUPERSTORE_SNAPSHOT_DIR=tmp, SUPERSTORE_DATA_PATH=csv_path)
+            command = [sys.executable, '-m', 'benchmarks.bench_pipeline', '--child', csv_path,
+                       '--repeat', str(args.repeat), '--replay-repeat', str(args.replay_repeat),
+                       '--app', args.app, '--seed', str(args.seed)]
+            if args.sequences:
+                command += ['--sequences', *args.sequences]
+            out = subprocess.run(command, check=True, capture_output=True, text=True, cwd=REPO_DIR, env=env).stdout
+            results['sizes'][size] = dict(json.loads(out.strip().splitlines()[-1]), csv_mb=os.path.getsize(csv_path) / 1024 ** 2)
+
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""Compare loading the Superstore data from CSV against a columnar snapshot.
+
+Usage (from the repository root):
+
+    python -m benchmarks.bench_snapshot --scale 100
+
+The sample CSV is repeated --scale times to mimic production-sized exports.
+Each loader runs in a fresh interpreter: "cold" is the first load in that
+process, "warm" the median of the following loads, and RSS is the growth in
+resident memory while the loaded frame is alive (Linux only).
+"""
+
+import argparse
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import snapshot
+from data_loader import DEFAULT_DATA_PATH, parse_superstore
+
+CHART_COLUMNS = ['Order Date', 'Region', 'State', 'City', 'Segment', 'Category', 'Sub-Category', 'Sales', 'Quantity', 'Profit']
+
+LOADERS = ['csv', 'csv_typed', 'snapshot_all', 'snapshot_chart_columns']
+
+
+def make_scaled_csv(path, scale):
+    with open(DEFAULT_DATA_PATH, 'rb') as f:
+        header, body = f.read().split(b'\n', 1)
+    if not body.endswith(b'\n'):
+        body += b'\n'
+    with open(path, 'wb') as f:
+        f.write(header + b'\n')
+        for _ in range(scale):
+            f.write(body)
+
+
+def load(kind, csv_path, digest):
+    if kind == 'csv':
+        # what dashboard.py did before the shared loader
+        df = pd.read_csv(csv_path)
+        df['Order Date'] = pd.to_datetime(df['Order Date'], errors='coerce')
+        return df
+    if kind == 'csv_typed':
+        return parse_superstore(csv_path)
+    columns = CHART_COLUMNS if kind == 'snapshot_chart_columns' else None
+    return snapshot.table_to_frame(snapshot.open_snapshot(digest), columns)
+
+
+def rss_mb():
+    # current resident set; file-backed pages of a mapped snapshot count once touched
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 1024 ** 2
+
+
+def child(kind, csv_path, digest, repeat):
+    base_rss = rss_mb()
+    start = time.perf_counter()
+    df = load(kind, csv_path, digest)
+    cold = time.perf_counter() - start
+    rss = rss_mb() - base_rss
+    del df
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = load(kind, csv_path, digest)
+        warm.append(time.perf_counter() - start)
+        del df
+    print(json.dumps({'loader': kind, 'cold_s': cold, 'warm_s': statistics.median(warm) if warm else None, 'rss_mb': rss}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scale', type=int, default=100, help='times to repeat the sample CSV')
+    parser.add_argument('--repeat', type=int, default=3, help='warm loads per loader')
+    parser.add_argument('--child', nargs=3, metavar=('LOADER', 'CSV', 'DIGEST'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child, args.repeat)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # children pick the directory up from the environment
+        os.environ['SUPERSTORE_SNAPSHOT_DIR'] = snapshot.SNAPSHOT_DIR = tmp
+
+        csv_path = os.path.join(tmp, 'superstore.csv')
+        make_scaled_csv(csv_path, args.scale)
+        digest = 'bench'
+        start = time.perf_counter()
+        snapshot.write_snapshot(parse_superstore(csv_path), digest)
+        ingest = time.perf_counter() - start
+
+        results = {
+            'scale': args.scale,
+            'csv_mb': os.path.getsize(csv_path) / 1024 ** 2,
+            'ingest_s': ingest,
+            'loaders': [],
+        }
+        for kind in LOADERS:
+            out = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.bench_snapshot', '--repeat', str(args.repeat), '--child', kind, csv_path, digest],
+                check=True, capture_output=True, text=True, env=os.environ,
+            ).stdout
+            results['loaders'].append(json.loads(out.strip().splitlines()[-1]))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Synthetic Superstore-shaped data for benchmarks.
+
+Rows are resampled from the bundled sample so the Region/State/City and
+Category/Sub-Category hierarchies stay realistic, with fresh order dates and
+jittered Sales/Profit. String columns come back as categoricals, which keeps
+10M-row frames within a few GB.
+"""
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATE_FORMAT, DEFAULT_DATA_PATH, parse_superstore
+
+SIZES = {'10k': 10_000, '1M': 1_000_000, '10M': 10_000_000}
+
+_base = None
+
+
+def _base_frame():
+    global _base
+    if _base is None:
+        base = parse_superstore(DEFAULT_DATA_PATH)
+        for column in base.columns:
+            if pd.api.types.is_string_dtype(base[column].dtype):
+                base[column] = base[column].astype('category')
+        _base = base
+    return _base
+
+
+def make_superstore(n_rows, seed=0, columns=None, sort=True):
+    """Return an n_rows frame with the Superstore schema (or just columns).
+
+    With sort=True the rows are in Order Date order, like frames produced by
+    data_loader.
+    """
+    base = _base_frame()
+    rng = np.random.default_rng(seed)
+    source = rng.integers(0, len(base), n_rows)
+    start = base['Order Date'].min()
+    span = (base['Order Date'].max() - start).days + 1
+    order_dates = start + pd.to_timedelta(rng.integers(0, span, n_rows), unit='D')
+    jitter = rng.lognormal(0.0, 0.25, n_rows)
+
+    data = {}
+    for column in columns or base.columns:
+        if column == 'Row ID':
+            data[column] = np.arange(1, n_rows + 1)
+        elif column == 'Order Date':
+            data[column] = order_dates
+        elif column == 'Ship Date':
+            data[column] = order_dates + pd.to_timedelta(rng.integers(0, 8, n_rows), unit='D')
+        elif column in ('Sales', 'Profit'):
+            data[column] = base[column].to_numpy()[source] * jitter
+        else:
+            data[column] = base[column].take(source).reset_index(drop=True)
+    df = pd.DataFrame(data)
+    if sort and 'Order Date' in df.columns:
+        df = df.sort_values('Order Date', kind='stable', ignore_index=True)
+    return df
+
+
+def write_csv(df, path):
+    """Write df the way the Superstore export is formatted."""
+    df.to_csv(path, index=False, date_format=DATE_FORMAT)
@@ -0,0 +1,196 @@
+"""Blocked reduction of the aggregation cube, in-process or across a process pool.
+
+The selected rows are cut into fixed blocks of BLOCK_ROWS. Each block is
+reduced on its own to (cells present, counts, per-measure sums), and the block
+results are added up in block order. The serial and the parallel path run the
+same blocks through the same kernel and merge them the same way, so their
+floating-point sums are bit-identical whatever the number of workers; only
+who reduces a block differs.
+
+Above PARALLEL_ROWS selected rows, blocks are spread over a pool of WORKERS
+processes. The cell keys and measures of a dataset are copied once into a
+shared memory segment, which the workers map instead of receiving the columns
+pickled; per call only the block ranges (or the selected row positions) are
+sent. When the pool cannot be used, the blocks are reduced in-process.
+"""
+
+import multiprocessing
+import os
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from row_selection import selection_size
+
+BLOCK_ROWS = 1 << 18
+
+# selections of at least this many rows are reduced in parallel
+PARALLEL_ROWS = int(os.environ.get('SUPERSTORE_PARALLEL_ROWS', 2_000_000))
+WORKERS = int(os.environ.get('SUPERSTORE_WORKERS', os.cpu_count() or 1))
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+# id(keys) -> SharedColumns for the datasets reduced in parallel so far
+_shared = {}
+
+
+def reduce_block(keys, measures, dense):
+    """(cells present, counts, sums per measure) of one block of rows."""
+    if dense:
+        counts = np.bincount(keys)
+        present = np.flatnonzero(counts)
+        sums = [np.bincount(keys, weights=values)[present] for values in measures]
+        return present, counts[present], sums
+    present, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(present))
+    sums = [np.bincount(inverse, weights=values, minlength=len(present)) for values in measures]
+    return present, counts, sums
+
+
+def merge_blocks(parts, n_measures, cells, dense):
+    """Add the block results up in block order; returns (cells present, counts, sums)."""
+    if dense:
+        counts = np.zeros(cells, dtype=np.int64)
+        sums = [np.zeros(cells) for _ in range(n_measures)]
+        for present, block_counts, block_sums in parts:
+            counts[present] += block_counts
+            for total, values in zip(sums, block_sums):
+                total[present] += values
+        present = np.flatnonzero(counts)
+        return present, counts[present], [total[present] for total in sums]
+    present = np.unique(np.concatenate([part[0] for part in parts])) if parts else np.empty(0, dtype=np.int64)
+    counts = np.zeros(len(present), dtype=np.int64)
+    sums = [np.zeros(len(present)) for _ in range(n_measures)]
+    for block_present, block_counts, block_sums in parts:
+        at = np.searchsorted(present, block_present)
+        counts[at] += block_counts
+        for total, values in zip(sums, block_sums):
+            total[at] += values
+    return present, counts, sums
+
+
+def _blocks(rows, n_rows):
+    """The selection cut into consecutive BLOCK_ROWS pieces (slices or position arrays)."""
+    if isinstance(rows, slice):
+        start, stop, step = rows.indices(n_rows)
+        if step != 1:
+            rows = np.arange(start, stop, step)
+        else:
+            return [slice(lo, min(lo + BLOCK_ROWS, stop)) for lo in range(start, stop, BLOCK_ROWS)]
+    return [rows[lo:lo + BLOCK_ROWS] for lo in range(0, len(rows), BLOCK_ROWS)]
+
+
+def _reduce_serial(keys, measures, blocks, dense):
+    return [reduce_block(keys[block], [values[block] for values in measures], dense) for block in blocks]
+
+
+class SharedColumns:
+    """Cell keys and measures of one dataset, copied into a shared memory segment."""
+
+    def __init__(self, keys, measures):
+        self.n = len(keys)
+        self.n_measures = len(measures)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(1, 8 * self.n * (1 + self.n_measures)))
+        view = _columns(self.memory.buf, self.n, self.n_measures)
+        view[0].view(np.int64)[:] = keys
+        for i, values in enumerate(measures, 1):
+            view[i][:] = values
+        self.name = self.memory.name
+        self._finalizer = weakref.finalize(self, _unlink, self.memory)
+
+
+def _unlink(memory):
+    memory.close()
+    memory.unlink()
+
+
+def _columns(buffer, n, n_measures):
+    # row 0 holds the int64 keys reinterpreted as float64, rows 1.. the measures
+    return np.ndarray((1 + n_measures, n), dtype=np.float64, buffer=buffer)
+
+
+def _shared_columns(keys, measures):
+    shared = _shared.get(id(keys))
+    if shared is None:
+        shared = _shared[id(keys)] = SharedColumns(keys, measures)
+        # drop the segment together with the dataset's keys
+        weakref.finalize(keys, _shared.pop, id(keys), None)
+    return shared
+
+
+# worker side: the segment mapped last, reused while the same dataset is reduced
+_attached = None
+
+
+def _attach(name):
+    global _attached
+    if _attached is None or _attached.name != name:
+        if _attached is not None:
+            _attached.close()
+        # workers share the parent's resource tracker, which unlinks the segment if the parent dies
+        _attached = shared_memory.SharedMemory(name=name)
+    return _attached
+
+
+def _reduce_task(name, n, n_measures, blocks, dense):
+    columns = _columns(_attach(name).buf, n, n_measures)
+    keys = columns[0].view(np.int64)
+    return _reduce_serial(keys, columns[1:], blocks, dense)
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False, cancel_futures=True)
+            # spawn: forking the multi-threaded Streamlit server is not safe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def _discard_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _reduce_parallel(keys, measures, blocks, dense, workers):
+    shared = _shared_columns(keys, measures)
+    pool = _get_pool(workers)
+    # contiguous runs of blocks per task, a few per worker to even out the load
+    tasks = np.array_split(np.arange(len(blocks)), min(len(blocks), workers * 4))
+    futures = [pool.submit(_reduce_task, shared.name, shared.n, shared.n_measures, [blocks[i] for i in task], dense) for task in tasks]
+    return [part for future in futures for part in future.result()]
+
+
+def reduce_rows(keys, measures, rows, cells, dense, workers=None):
+    """Reduce the selected rows to (cells present, counts, sums per measure).
+
+    keys and measures are full-length columns of the dataset. workers=None
+    picks WORKERS above PARALLEL_ROWS selected rows and the serial path
+    otherwise; workers=1 forces the serial path.
+    """
+    n_rows = len(keys)
+    blocks = _blocks(rows, n_rows)
+    if workers is None:
+        workers = WORKERS if selection_size(rows, n_rows) >= PARALLEL_ROWS else 1
+    parts = None
+    if workers > 1 and len(blocks) > 1:
+        try:
+            parts = _reduce_parallel(keys, measures, blocks, dense, workers)
+        except (OSError, BrokenProcessPool):
+            # no shared memory or no worker processes here: reduce in-process,
+            # and start a fresh pool next time
+            _discard_pool()
+    if parts is None:
+        parts = _reduce_serial(keys, measures, blocks, dense)
+    return merge_blocks(parts, len(measures), cells, dense)
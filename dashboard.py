@@ -1,8 +1,18 @@
 import streamlit as st
-import plotly.express as px
 import pandas as pd
 import matplotlib # its essential as we are using background_gradient and colors
 import warnings
+import pipeline
+from data_loader import cache_stats
+from figure_metrics import log_figure_size
+from scatter import DEFAULT_POINT_BUDGET, MODES
+from time_buckets import GRANULARITIES
+from view_cache import filter_key
+from shared_store import SessionData, dataset_report, session_report
+from exports import frame_csv, table_csv
+from data_grid import Gradient, PAGE_SIZES, DEFAULT_PAGE_SIZE, numeric_ranges, page_frame, sorted_rows
+from row_selection import selection_size
+from instrumentation import Rerun, SessionStats, profile_summary
 warnings.filterwarnings('ignore')
 
 
@@ -10,6 +20,10 @@ warnings.filterwarnings('ignore')
 # Set page configuration
 st.set_page_config(page_title='SuperStore!!!', page_icon=':bar_chart:', layout='wide')
 
+# opt-in stage timings (SUPERSTORE_INSTRUMENT=1); with instrumentation off stage() just calls the function
+rerun = Rerun(st.session_state.setdefault('session_stats', SessionStats()), profile=st.session_state.pop('profile_rerun', False))
+stage = rerun.measure
+
 # Title of the app
 st.title(' :bar_chart: Sample SuperStore EDA') # you can do if getting port error in terminal -> streamlit run .\dashboard.py --server.port 8888 or 8080
 st.markdown('<style>div.block-container{padding-top:1rem;}</style>', unsafe_allow_html=True) # to bring the name of title to start at beggining of the page
@@ -17,80 +31,105 @@ st.markdown('<style>div.block-container{padding-top:1rem;}</style>', unsafe_allo
 # File uploader widget for user to upload a file
 uploaded_file = st.file_uploader(': file_folder: Upload a file', type=(['csv','txt','xlsx','xls', 'csv'])) # user can upload the file
 
-if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)
-else:
-    # os.chdir(r'C:\Users\ashra\Downloads\VS Code\streamlit_superstore')
-    df = pd.read_csv('C:\\Users\\ashra\\Downloads\\VS Code\\streamlit_superstore\\Sample - Superstore.csv')
+# large files are streamed in chunks; until the whole file is in, partial charts are drawn here
+preview = st.empty()
+
+def show_progress(streamed, fraction):
+    partial = streamed.aggregates()
+    with preview.container():
+        st.progress(fraction or 0.0, text=f'Loading... {streamed.rows:,} rows so far')
+        st.caption(f"{len(streamed.options('Region'))} regions, {len(streamed.options('State'))} states, {len(streamed.options('City'))} cities so far")
+        p1, p2 = st.columns(2)
+        with p1:
+            st.plotly_chart(pipeline.category_bar(partial.category_sales()), use_container_width=True, key=f'preview_category_{streamed.chunks}')
+        with p2:
+            st.plotly_chart(pipeline.region_pie(partial.region_sales()), use_container_width=True, key=f'preview_region_{streamed.chunks}')
+        st.plotly_chart(pipeline.time_series_line(partial.monthly_sales(), 'Month'), use_container_width=True, key=f'preview_monthly_{streamed.chunks}')
+
+# parsed once per file content and shared by every session (falls back to the bundled Sample - Superstore.csv)
+# every stage below is a plain function in pipeline.py, shared with benchmarks/bench_pipeline.py
+dataset = stage('load', pipeline.load, uploaded_file, show_progress)
+preview.empty()
+
+# new orders from delta files are appended to the loaded data in upload order (rows whose Row ID is already
+# there are skipped); indexes and totals are updated from the new rows only
+delta_files = st.sidebar.file_uploader('Append new orders', type=['csv', 'txt', 'xlsx', 'xls'], accept_multiple_files=True, key='delta_file')
+if delta_files:
+    base_rows = len(dataset)
+    for delta_file in delta_files:
+        try:
+            dataset = stage('append', pipeline.append, dataset, delta_file)
+        except ValueError as error:
+            st.sidebar.error(f'Could not append {delta_file.name}: {error}')
+    st.sidebar.caption(f'{len(dataset) - base_rows:,} new orders appended')
+
+# the session only holds a counted reference to the shared copy, plus its own filter rows and views
+session = st.session_state.setdefault('session_data', SessionData())
+dataset = session.use(dataset)
 
 col1, col2 = st.columns((2))
 
-df['Order Date'] = pd.to_datetime(df['Order Date'], errors='coerce')
-
-# getting the min and max date
+# getting the min and max date (from a binary-search index over the Order Dates, built once per dataset)
 
-startDate = pd.to_datetime(df['Order Date']).min()
-endDate = pd.to_datetime(df['Order Date']).max()
+date_index = stage('date_index', pipeline.date_index, dataset)
+startDate = date_index.min
+endDate = date_index.max
+if pd.isna(startDate):
+    st.error('The data has no valid Order Date, so there is nothing to chart.')
+    st.stop()
 
 with col1:
     date1 = pd.to_datetime(st.date_input('Start Date', startDate))
 with col2:
     date2 = pd.to_datetime(st.date_input('End Date', endDate))
 
-df = df[(df['Order Date'] >= date1) & (df['Order Date'] <= date2)].copy()
+window = stage('date_window', pipeline.date_window, dataset, date1, date2, rows_in=len(dataset)) # a slice of the date-sorted rows, found by binary search
 
 st.sidebar.header('Choose your filter: ')
+stats = cache_stats()
+st.sidebar.caption(f"Data cache: {stats['hits']} hits / {stats['misses']} misses")
 
-# create for the region
-region = st.sidebar.multiselect('Pick your region', df['Region'].unique())
+# region/state/city row positions, built once per dataset and shared by every session
+filter_index = stage('filter_index', pipeline.filter_index, dataset)
 
-if not region:
-    df2 = df.copy()
-else:
-    df2 = df[df['Region'].isin(region)]
+# create for the region
+region = st.sidebar.multiselect('Pick your region', filter_index.options('Region', window=window))
 
 # create fo the state
-state = st.sidebar.multiselect('Pick the state from selected region', df2['State'].unique())
-
-if not state:
-    df3=df2.copy()
-else:
-    df3 = df2[df2['State'].isin(state)]
+state = st.sidebar.multiselect('Pick the state from selected region', filter_index.options('State', region=region, window=window))
 
 # create for the city
-city = st.sidebar.multiselect('Pick the city', df3['City'].unique())
-
-# filter the data based on the Region, state and city
-
-if not region and not state and not city:
-    filtered_df = df
-elif not state and not city:
-    filtered_df = df[df["Region"].isin(region)]
-elif not region and not city:
-    filtered_df = df[df["State"].isin(state)]
-elif state and city:
-    filtered_df = df[(df["State"].isin(state)) & (df["City"].isin(city))]
-elif region and city:
-    filtered_df = df[(df["Region"].isin(region)) & (df["City"].isin(city))]
-elif region and state:
-    filtered_df = df[(df["Region"].isin(region)) & (df["State"].isin(state))]
-elif city:
-    filtered_df = df[df["City"].isin(city)]
-else:
-    filtered_df = df[(df["Region"].isin(region)) & (df["State"].isin(state)) & (df["City"].isin(city))]
-
-
-category_df = filtered_df.groupby(by = ['Category'], as_index = False)['Sales'].sum()
+city = st.sidebar.multiselect('Pick the city', filter_index.options('City', region=region, state=state, window=window))
+
+# filter the data based on the Region, state and city (any combination of selections)
+
+rows = stage('location_rows', pipeline.location_rows, dataset, region, state, city, window, rows_in=window)
+session.rows = rows
+st.sidebar.caption(f'Dataset shared by {dataset.refs} session(s); this session holds {session.nbytes() / 1024:,.1f} KB')
+
+# expander contents and downloads are only built when opened/clicked, and reused until the filters change
+view_cache = session.views
+view_key = filter_key(dataset.digest, window, region, state, city)
+
+def lazy(name, build):
+    return view_cache.get(view_key, name, build)
+
+# one grouped pass over the filtered rows; every chart/table below is cut from this small cube
+aggregates = stage('aggregate', pipeline.aggregate_rows, dataset, rows, rows_in=rows)
+
+category_df = stage('category_sales', aggregates.category_sales)
 
 with col1:
     st.subheader('Category wise Sales')
-    fig = px.bar(category_df, x='Category', y='Sales', text=['${:,.2f}'.format(x) for x in category_df['Sales']], template='seaborn')
+    fig = stage('category_bar', pipeline.category_bar, category_df)
+    log_figure_size('category_bar', fig)
     st.plotly_chart(fig, use_container_width=True, height=200)
 
 with col2:
     st.subheader('Region wise Sales')
-    fig = px.pie(filtered_df, values='Sales', names='Region', hole=0.5)
-    fig.update_traces(text=filtered_df['Region'], textposition='outside')  # Corrected method name
+    region_df = stage('region_sales', aggregates.region_sales) # one slice per region, so the payload does not grow with the rows
+    fig = stage('region_pie', pipeline.region_pie, region_df)
+    log_figure_size('region_pie', fig)
     st.plotly_chart(fig, use_container_width=True)
 
 
@@ -99,39 +138,44 @@ with col2:
 cl1, cl2 = st.columns(2)
 
 with cl1:
-    with st.expander("Category_ViewData"):
-        st.write(category_df.style.background_gradient(cmap='Blues'))
-        csv_category = category_df.to_csv(index=False).encode('utf-8')
-        st.download_button('Download Data', data=csv_category, file_name='Category.csv', mime='text/csv', help='Click here to download csv')
+    category_expander = st.expander("Category_ViewData", key='category_expander', on_change='rerun')
+    if category_expander.open:
+        with category_expander:
+            stage('category_table', st.write, lazy('category_style', lambda: category_df.style.background_gradient(cmap='Blues')))
+            st.download_button('Download Data', data=lambda: lazy('category_csv', lambda: frame_csv(category_df)), file_name='Category.csv', mime='text/csv', help='Click here to download csv')
 
 with cl2:
-    with st.expander("Region_ViewData"):
-        region = filtered_df.groupby(by='Region', as_index=False)['Sales'].sum()
-        st.write(region.style.background_gradient(cmap='Oranges'))
-        csv_region = region.to_csv(index=False).encode('utf-8')
-        st.download_button('Download Data', data=csv_region, file_name='Region.csv', mime='text/csv', help='Click here to download csv')
-
-filtered_df['month_year'] = filtered_df['Order Date'].dt.to_period('M')
+    region_expander = st.expander("Region_ViewData", key='region_expander', on_change='rerun')
+    if region_expander.open:
+        with region_expander:
+            stage('region_table', st.write, lazy('region_style', lambda: region_df.style.background_gradient(cmap='Oranges')))
+            st.download_button('Download Data', data=lambda: lazy('region_csv', lambda: frame_csv(region_df)), file_name='Region.csv', mime='text/csv', help='Click here to download csv')
 
 st.subheader('Time Series Analysis')
 
-linechart = pd.DataFrame(filtered_df.groupby(filtered_df['month_year'].dt.strftime('%Y : %b'))['Sales'].sum()).reset_index()
+granularity = st.radio('Granularity', GRANULARITIES, index=GRANULARITIES.index('Month'), horizontal=True)
+# grouped on integer bucket codes (cached per dataset), so buckets stay in calendar order and only the output gets labels
+linechart = stage('time_series', pipeline.time_series, dataset, aggregates, granularity)
 
-fig2 = px.line(linechart, x='month_year', y='Sales', labels={'Sales': 'Amount'}, height=500, width=1000, template='gridon')
+fig2 = stage('time_series_line', pipeline.time_series_line, linechart, granularity)
+log_figure_size('time_series', fig2)
 st.plotly_chart(fig2, use_container_width=True)
 
 
-with st.expander('View Data of TimeSeries: '):
-    st.write(linechart.T.style.background_gradient(cmap = 'Blues'))
-    csv = linechart.to_csv(index=False).encode('utf-8')
-    st.download_button('Download Data', data = csv, file_name= 'TimeSeries.csv', mime = 'text/csv')
+timeseries_expander = st.expander('View Data of TimeSeries: ', key='timeseries_expander', on_change='rerun')
+if timeseries_expander.open:
+    with timeseries_expander:
+        # Day/Week have hundreds to thousands of buckets: one row each instead of one column each
+        timeseries_table = linechart.T if granularity in ('Month', 'Quarter') else linechart
+        stage('time_series_table', st.write, lazy(('timeseries_style', granularity), lambda: timeseries_table.style.background_gradient(cmap = 'Blues')))
+        st.download_button('Download Data', data = lambda: lazy(('timeseries_csv', granularity), lambda: frame_csv(linechart)), file_name= 'TimeSeries.csv', mime = 'text/csv')
 
-# create a tree map based on Region, category and sub-category
+# create a tree map based on Region, category and sub-category (from the pre-aggregated hierarchy, not the raw rows)
 
 st.subheader('Hirearcial view of sales using Tree Map')
 
-fig3 = px.treemap(filtered_df, path = ['Region', 'Category', 'Sub-Category'], values = 'Sales', hover_data = ['Sales'], color = 'Sub-Category')
-fig3.update_layout(width = 800, height = 650)
+fig3 = stage('treemap', pipeline.treemap, stage('hierarchy_sales', aggregates.hierarchy_sales))
+log_figure_size('treemap', fig3)
 st.plotly_chart(fig3, use_container_width=True)
 
 # segment wise category wise sales
@@ -140,42 +184,87 @@ chart1, chart2 = st.columns((2))
 
 with chart1:
     st.subheader('Segment wise sales')
-    fig = px.pie(filtered_df, values = 'Sales', names = 'Segment', template= 'plotly_dark')
-    fig.update_traces(text = filtered_df['Segment'], textposition = 'inside')
+    segment_df = stage('segment_sales', aggregates.segment_sales)
+    fig = stage('segment_pie', pipeline.segment_pie, segment_df)
+    log_figure_size('segment_pie', fig)
     st.plotly_chart(fig, use_container_width=True)
 
 with chart2:
     st.subheader('Category wise sales')
-    fig = px.pie(filtered_df, values = 'Sales', names = 'Category', template= 'gridon')
-    fig.update_traces(text = filtered_df['Category'], textposition = 'inside')
+    fig = stage('category_pie', pipeline.category_pie, category_df)
+    log_figure_size('category_pie', fig)
     st.plotly_chart(fig, use_container_width=True)
 
-import plotly.figure_factory as ff
 st.subheader(':point_right: Month wise sub-category sales summary')
-with st.expander('Summary_Table'):
-    df_sample = df[0:5][['Region', 'State', 'City', 'Category', 'Sales', 'Profit', 'Quantity']]
-    fig = ff.create_table(df_sample, colorscale='Cividis')
-    st.plotly_chart(fig, use_container_width=True)
+summary_expander = st.expander('Summary_Table', key='summary_expander', on_change='rerun')
+if summary_expander.open:
+    with summary_expander:
+        fig = lazy('summary_table', lambda: stage('summary_table', pipeline.summary_table, dataset, window))
+        log_figure_size('summary_table', fig)
+        st.plotly_chart(fig, use_container_width=True)
+
+        st.markdown('Month wise sub-Cateogry table')
+        sub_category_year = lazy('subcategory_month', lambda: stage('subcategory_month_sales', aggregates.subcategory_month_sales))
+        stage('subcategory_month_table', st.write, lazy('subcategory_month_style', lambda: sub_category_year.style.background_gradient(cmap='Blues')))
 
-    st.markdown('Month wise sub-Cateogry table')
-    filtered_df['Month']=filtered_df['Order Date'].dt.month_name()
-    sub_category_year = pd.pivot_table(data= filtered_df, values = 'Sales', index = ['Sub-Category'], columns = 'Month')
-    st.write(sub_category_year.style.background_gradient(cmap='Blues'))
+# Create a scatter plot (above the point budget the orders are binned or sampled before they reach the browser)
 
-# Create a scatter plot
+st.sidebar.subheader('Scatter plot')
+point_budget = st.sidebar.number_input('Point budget', min_value=100, value=DEFAULT_POINT_BUDGET, step=500)
+scatter_mode = st.sidebar.radio('Above the budget', MODES, format_func={'bin': 'Density grid', 'sample': 'Sample (keeps outliers)'}.get)
 
-data1 = px.scatter(filtered_df, x = 'Sales', y="Profit", size= 'Quantity')
-data1['layout'].update(title='Relationship Between sales and profits using scatter plot', titlefont = dict(size =20), 
-                       xaxis = dict(title = 'Sales', titlefont = dict(size=19)),
-                       yaxis = dict(title = 'Profit', titlefont = dict(size=19)))
+data1, represented, rendered = stage('scatter', pipeline.scatter, dataset, rows, point_budget, scatter_mode, rows_in=rows)
+log_figure_size('scatter', data1)
 st.plotly_chart(data1, use_container_width=True)
+unplaced = selection_size(rows, len(dataset)) - represented
+st.caption((f'Showing {rendered:,} of {represented:,} orders' if rendered == represented or scatter_mode == 'sample' else f'{represented:,} orders binned into {rendered:,} grid cells')
+           + (f' ({unplaced:,} without Sales or Profit left out)' if unplaced else ''))
 
 # download entire dataset with selection
 
-with st.expander('View Data'):
-    st.write(filtered_df.iloc[:500, 1:20:2].style.background_gradient(cmap='Oranges')) # giving only top 500
-
-# download the original dataset
-
-csv = df.to_csv(index=False).encode('utf-8')
-st.download_button('Download Data', data=csv, file_name='Data.csv', mime='text/csv')
+view_expander = st.expander('View Data', key='view_expander', on_change='rerun')
+if view_expander.open:
+    with view_expander:
+        # one page of the filtered rows at a time; sorting and colour ranges are computed once per filter state
+        grid_columns = st.multiselect('Columns', dataset.columns, default=dataset.columns[1:20:2], key='grid_columns')
+        g1, g2, g3 = st.columns(3)
+        with g1:
+            sort_column = st.selectbox('Sort by', grid_columns, index=None, placeholder='Row order', key='grid_sort')
+        with g2:
+            page_size = st.selectbox('Rows per page', PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key='grid_page_size')
+        with g3:
+            descending = st.toggle('Descending', key='grid_descending')
+
+        total = selection_size(rows, len(dataset))
+        pages = max(1, -(-total // page_size))
+        if st.session_state.get('grid_page', 1) > pages:
+            st.session_state['grid_page'] = pages
+        page = st.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, step=1, key='grid_page') - 1
+
+        ordered = rows if sort_column is None else lazy(('grid_order', sort_column, descending), lambda: stage('grid_sort', sorted_rows, dataset, rows, sort_column, not descending, rows_in=rows))
+        gradient = lazy(('grid_gradient', tuple(grid_columns)), lambda: Gradient('Oranges', numeric_ranges(dataset, rows, grid_columns)))
+        page_df = stage('grid_page', page_frame, dataset, ordered, grid_columns, page, page_size, rows_in=total)
+        stage('grid_table', st.dataframe, page_df.style.apply(gradient.css, axis=None))
+        st.caption(f'Rows {min(page * page_size + 1, total):,}-{min((page + 1) * page_size, total):,} of {total:,}')
+
+# download the original dataset (streamed from the snapshot in chunks, only when the button is clicked)
+
+st.download_button('Download Data', data=lambda: table_csv(dataset.table, window), file_name='Data.csv', mime='text/csv')
+
+# debug panel: this rerun's and this session's stage timings (only with instrumentation on)
+
+if rerun.enabled:
+    record = rerun.finish()
+    with st.sidebar.expander('Debug: stage timings'):
+        st.caption(f"Rerun {record['rerun']} of session {record['session']}: {record['total_ms']:,.0f} ms")
+        st.dataframe(rerun.frame(), hide_index=True)
+        st.caption('This session, per stage')
+        st.dataframe(rerun.session.frame(), hide_index=True)
+        st.caption('Shared datasets')
+        st.dataframe(dataset_report(), hide_index=True)
+        st.caption('Sessions')
+        st.dataframe(session_report(), hide_index=True)
+        st.button('Profile one rerun', help='Runs the next rerun under cProfile', on_click=lambda: st.session_state.update(profile_rerun=True))
+        if rerun.profile_path:
+            st.code(profile_summary(rerun.profile_path))
+            st.download_button('Download cProfile dump', data=rerun.profile_bytes(), file_name='rerun.prof')
\ No newline at end of file
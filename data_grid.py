@@ -0,0 +1,114 @@
+"""Paginated data grid for the View Data expander.
+
+Only one page of the filtered rows is ever fetched from the columnar snapshot
+and styled, so the cost of showing a page does not depend on how many rows
+the filters select. The heavier steps run once per filter state instead of
+once per page:
+
+* sorting: every column gets a dense rank per dataset (built on first use),
+  and a selection is ordered by a stable argsort of its rows' ranks;
+* colouring: the value range of each numeric column over the selection is
+  computed once, and pages are coloured by indexing a precomputed colormap
+  table with NumPy, instead of Styler.background_gradient calling matplotlib
+  for every cell.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from matplotlib import colormaps, colors
+
+from snapshot import table_to_frame
+
+PAGE_SIZES = (25, 50, 100, 250)
+DEFAULT_PAGE_SIZE = 50
+# number of colours sampled from the colormap
+LUT_SIZE = 256
+# Styler.background_gradient switches to light text below this luminance
+TEXT_COLOR_THRESHOLD = 0.408
+
+
+def sort_ranks(dataset, column):
+    """(ranks, missing): dense rank of every row's value in column, missing values ranked last."""
+    def build(d):
+        codes, uniques = pd.factorize(d.select([column])[column], sort=True)
+        ranks = codes.astype(np.int32)
+        ranks[codes < 0] = len(uniques)
+        return ranks, len(uniques)
+    return dataset.derive(('sort_ranks', column), build)
+
+
+def sorted_rows(dataset, rows, column, ascending=True):
+    """Positions of the selected rows ordered by column.
+
+    Ties keep row order and missing values go last in both directions.
+    """
+    if isinstance(rows, slice):
+        positions = np.arange(*rows.indices(len(dataset)))
+    else:
+        positions = np.asarray(rows)
+    ranks, missing = sort_ranks(dataset, column)
+    keys = ranks[positions]
+    if not ascending:
+        keys = np.where(keys == missing, missing, missing - 1 - keys)
+    return positions[np.argsort(keys, kind='stable')]
+
+
+def page_frame(dataset, rows, columns, page, page_size):
+    """The given columns of one page of a selection, indexed by row position."""
+    start = page * page_size
+    if isinstance(rows, slice):
+        first, last, _ = rows.indices(len(dataset))
+        positions = np.arange(min(first + start, last), min(first + start + page_size, last))
+    else:
+        positions = np.asarray(rows[start:start + page_size])
+    frame = table_to_frame(dataset.table.select(list(columns)).take(positions))
+    frame.index = positions
+    return frame
+
+
+def numeric_ranges(dataset, rows, columns):
+    """{column: (min, max)} over the selected rows, for the numeric columns among columns."""
+    ranges = {}
+    for column in columns:
+        field_type = dataset.table.schema.field(column).type
+        if not (pa.types.is_integer(field_type) or pa.types.is_floating(field_type)):
+            continue
+        values = dataset.select([column])[column].to_numpy(dtype=np.float64, na_value=np.nan)[rows]
+        if len(values) and not np.isnan(values).all():
+            ranges[column] = (np.nanmin(values), np.nanmax(values))
+    return ranges
+
+
+def _relative_luminance(rgba):
+    channels = rgba[:, :3]
+    linear = np.where(channels <= 0.04045, channels / 12.92, ((channels + 0.055) / 1.055) ** 2.4)
+    return linear @ np.array([0.2126, 0.7152, 0.0722])
+
+
+class Gradient:
+    """Per-column background gradient over fixed value ranges, as Styler CSS.
+
+    Matches Styler.background_gradient's colours and text colour switch, but
+    the ranges come from the whole selection, so colours stay comparable
+    across pages.
+    """
+
+    def __init__(self, cmap, ranges):
+        rgba = colormaps[cmap](np.linspace(0, 1, LUT_SIZE))
+        text = np.where(_relative_luminance(rgba) < TEXT_COLOR_THRESHOLD, '#f1f1f1', '#000000')
+        self.styles = np.array([f'background-color: {colors.to_hex(colour)}; color: {fg};'
+                                for colour, fg in zip(rgba, text)], dtype=object)
+        self.ranges = ranges
+
+    def css(self, frame):
+        """DataFrame of CSS strings for frame, for Styler.apply(..., axis=None)."""
+        css = pd.DataFrame('', index=frame.index, columns=frame.columns)
+        for column, (low, high) in self.ranges.items():
+            if column not in frame.columns:
+                continue
+            values = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            scaled = (values - low) / (high - low) if high > low else np.zeros(len(values))
+            slots = np.clip(np.nan_to_num(scaled * LUT_SIZE), 0, LUT_SIZE - 1).astype(np.int64)
+            css[column] = np.where(np.isnan(values), '', self.styles[slots])
+        return css
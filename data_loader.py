@@ -0,0 +1,511 @@
+"""Shared data loading for the Superstore dashboards.
+
+Streamlit reruns the dashboard script on every widget interaction, so parsing
+the CSV inside the script means paying the full parse cost on every click.
+This module parses each distinct file once (keyed by a digest of its content),
+snapshots it to a columnar file so later processes can skip the parse, and
+keeps the loaded datasets in a process-wide, size-bounded LRU cache that all
+sessions share. Sessions hold counted references to the datasets they use
+(see shared_store.py); only unreferenced datasets are evicted, when they have
+been idle for IDLE_SECONDS or the cache is over MAX_CACHE_BYTES. The budget
+counts the snapshot data and the heap taken by the structures derived from
+it (indexes, codes, totals), which are measured as they are built.
+
+Large CSV/TXT/XLSX files are not parsed in one go: they are read in chunks
+that are appended to the snapshot one at a time and folded into running
+aggregates (streaming.py), which a progress callback can render while the
+rest of the file is read. Once the whole file is in, the streamed snapshot is
+rewritten in Order Date order a batch at a time, so date ranges are slices as
+for parsed files. It stores the categorical columns as plain strings, which
+the indexes built on top of it handle.
+"""
+
+import hashlib
+import io
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+import openpyxl
+import pyarrow as pa
+
+from incremental import SortedRuns
+from snapshot import has_snapshot, open_snapshot, sort_snapshot, table_to_frame, write_snapshot, write_snapshot_chunks
+from streaming import StreamingAggregates
+
+DEFAULT_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Sample - Superstore.csv')
+
+# The Superstore export writes dates as day-month-year (e.g. 16-06-2016).
+DATE_FORMAT = '%d-%m-%Y'
+DATE_COLUMNS = ['Order Date', 'Ship Date']
+
+CATEGORICAL_COLUMNS = ['Region', 'State', 'City', 'Segment', 'Category', 'Sub-Category', 'Ship Mode']
+
+DTYPES = {
+    'Row ID': 'int64',
+    'Order ID': 'string',
+    'Customer ID': 'string',
+    'Customer Name': 'string',
+    'Country': 'string',
+    'Postal Code': 'Int64',
+    'Product ID': 'string',
+    'Product Name': 'string',
+    'Sales': 'float64',
+    'Quantity': 'int64',
+    'Discount': 'float64',
+    'Profit': 'float64',
+}
+DTYPES.update({column: 'category' for column in CATEGORICAL_COLUMNS})
+
+# chunks are typed independently, so categories would differ from chunk to chunk
+STREAMED_DTYPES = dict(DTYPES)
+STREAMED_DTYPES.update({column: 'string' for column in CATEGORICAL_COLUMNS})
+
+# Files at least this large are streamed in chunks of CHUNK_ROWS rows.
+STREAMING_BYTES = int(os.environ.get('SUPERSTORE_STREAMING_BYTES', 64 * 1024 ** 2))
+CHUNK_ROWS = 100_000
+STREAMING_SUFFIXES = ('.csv', '.txt', '.xlsx')
+
+HASH_BLOCK_BYTES = 1024 ** 2
+
+# Appended rows are deduplicated on the first of these columns the data has.
+APPEND_KEYS = ('Row ID', 'Order ID')
+
+# Upper bound on the data held by loaded datasets across all sessions.
+MAX_CACHE_BYTES = 512 * 1024 ** 2
+
+# Datasets no session references are dropped after this long.
+IDLE_SECONDS = int(os.environ.get('SUPERSTORE_IDLE_SECONDS', 10 * 60))
+
+
+class Dataset:
+    """A parsed dataset plus any structures derived from it.
+
+    The data lives in a memory-mapped columnar snapshot (see snapshot.py);
+    columns are converted to pandas only when a view asks for them. Frames
+    handed out are shared between sessions and must be treated as read-only.
+    Derived structures (indexes, codes, ...) are built on first use through
+    derive() and live exactly as long as the dataset stays cached; their size
+    is kept in derived_nbytes and charged to the cache.
+    """
+
+    def __init__(self, digest, table):
+        self.digest = digest
+        self.table = table
+        self.nbytes = int(table.nbytes)
+        self.derived_nbytes = 0
+        # sessions referencing the dataset, and when it was last loaded or released
+        self.refs = 0
+        self.last_used = time.monotonic()
+        self._derived = {}
+        self._lock = threading.RLock()
+
+    def derive(self, name, build):
+        """Return the structure cached under name, building it with build(self) once."""
+        with self._lock:
+            if name not in self._derived:
+                value = self._derived[name] = build(self)
+                size = deep_nbytes(value)
+                self.derived_nbytes += size
+                _charge(self, size)
+            return self._derived[name]
+
+    @property
+    def derived(self):
+        """The structures built so far, by name."""
+        with self._lock:
+            return dict(self._derived)
+
+    @property
+    def columns(self):
+        return list(self.table.column_names)
+
+    @property
+    def frame(self):
+        """All columns as one DataFrame, converted on every access."""
+        return table_to_frame(self.table)
+
+    def select(self, columns):
+        """Only the given columns as a DataFrame, leaving the rest unconverted.
+
+        The frame is not kept: build what is worth keeping from it in derive().
+        """
+        return table_to_frame(self.table, columns)
+
+    def __len__(self):
+        return self.table.num_rows
+
+
+_cache = OrderedDict()
+_cache_bytes = 0
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+_path_digests = {}
+_lock = threading.Lock()
+
+
+def file_digest(data):
+    """Content digest used as the cache key."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def _path_digest(path):
+    """file_digest of the file at path, read a block at a time."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_BYTES), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_dates(values):
+    """Parse a date column, day-month-year first, inferring the layout of the values that do not fit.
+
+    Dates that parse in neither way become NaT.
+    """
+    dates = pd.to_datetime(values, format=DATE_FORMAT, errors='coerce')
+    failed = dates.isna() & values.notna()
+    if failed.any():
+        # another layout, e.g. the month/day/year of other Superstore exports
+        dates = dates.combine_first(pd.to_datetime(values[failed], errors='coerce'))
+    return dates
+
+
+def convert_dates(df):
+    """Parse the date columns present in df (see parse_dates)."""
+    for column in DATE_COLUMNS:
+        if column in df.columns:
+            df[column] = parse_dates(df[column])
+    return df
+
+
+def parse_superstore(buffer, name=''):
+    """Parse a Superstore export into a typed frame.
+
+    Only the columns present in the file get the typed treatment, so uploads
+    with a different schema still load. Rows are returned sorted by Order Date
+    (missing dates last) so date ranges can be found by binary search.
+    """
+    if name.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(buffer)
+    else:
+        df = pd.read_csv(buffer, dtype=DTYPES, encoding='utf-8-sig')
+    df = convert_dates(df)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+    if 'Order Date' in df.columns:
+        df = df.sort_values('Order Date', kind='stable', na_position='last', ignore_index=True)
+    return df
+
+
+def _typed_chunk(df):
+    df = df.astype({column: dtype for column, dtype in STREAMED_DTYPES.items() if column in df.columns})
+    return convert_dates(df)
+
+
+def iter_chunks(buffer, name='', chunk_rows=CHUNK_ROWS):
+    """Yield (typed frame, fraction of the file read) for chunks of a CSV/TXT/XLSX file.
+
+    Chunks are typed like parse_superstore's output except that categorical
+    columns stay strings, and they are not sorted. For XLSX the fraction is
+    None when the sheet does not declare its size.
+    """
+    if name.lower().endswith('.xlsx'):
+        workbook = openpyxl.load_workbook(buffer, read_only=True, data_only=True)
+        try:
+            # the first sheet, as read_excel would pick
+            sheet = workbook.worksheets[0]
+            records = sheet.iter_rows(values_only=True)
+            header = [str(value) for value in next(records, ())]
+            total = (sheet.max_row or 0) - 1
+            read = 0
+            while True:
+                block = list(islice(records, chunk_rows))
+                if not block:
+                    return
+                read += len(block)
+                yield _typed_chunk(pd.DataFrame.from_records(block, columns=header)), min(read / total, 1.0) if total > 0 else None
+        finally:
+            workbook.close()
+
+    size = buffer.seek(0, io.SEEK_END)
+    buffer.seek(0)
+    with pd.read_csv(buffer, dtype=STREAMED_DTYPES, encoding='utf-8-sig', chunksize=chunk_rows) as reader:
+        for chunk in reader:
+            # the parser reads ahead in blocks, so this runs slightly ahead of the rows yielded
+            yield convert_dates(chunk), min(buffer.tell() / size, 1.0) if size else None
+
+
+def _read_source(source):
+    """Return (digest, raw bytes or None, name) for a path or an uploaded file.
+
+    Files on disk are hashed a block at a time and read again only if they
+    have to be ingested.
+    """
+    if source is None:
+        source = os.environ.get('SUPERSTORE_DATA_PATH', DEFAULT_DATA_PATH)
+    if isinstance(source, (str, os.PathLike)):
+        path = os.fspath(source)
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = _path_digests.get(key)
+        if digest is None:
+            digest = _path_digests[key] = _path_digest(path)
+        return digest, None, path
+    data = source.getvalue() if hasattr(source, 'getvalue') else source.read()
+    return file_digest(data), data, getattr(source, 'name', '')
+
+
+def deep_nbytes(value, _seen=None):
+    """Approximate bytes held by value and everything it refers to.
+
+    Each object is counted once, numpy views are charged to the array owning
+    the data, and Datasets are not followed (they are reported on their own).
+    Arrays mapped from a snapshot file are counted, although the OS can page
+    them out.
+    """
+    seen = set() if _seen is None else _seen
+    if value is None or id(value) in seen or isinstance(value, Dataset):
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        if value.base is not None:
+            return deep_nbytes(value.base, seen)
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(item) for item in value.ravel())
+        return value.nbytes
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        columns = value.items() if isinstance(value, pd.DataFrame) else [(None, value)]
+        total = value.index.memory_usage()
+        for _, column in columns:
+            if isinstance(column.dtype, np.dtype):
+                total += deep_nbytes(column.to_numpy(copy=False), seen)
+            else:
+                total += column.array.nbytes
+        return total
+    if isinstance(value, (pa.Table, pa.ChunkedArray, pa.Array)):
+        return value.nbytes
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(deep_nbytes(k, seen) + deep_nbytes(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(deep_nbytes(item, seen) for item in value)
+    if hasattr(value, '__dict__') and not callable(value):
+        return sys.getsizeof(value) + deep_nbytes(vars(value), seen)
+    return sys.getsizeof(value)
+
+
+def _drop(digest):
+    global _cache_bytes
+    dataset = _cache.pop(digest)
+    _cache_bytes -= dataset.nbytes + dataset.derived_nbytes
+    _stats['evictions'] += 1
+
+
+def _evict(pinned=None):
+    """Drop unreferenced datasets: idle ones, then the least recently used while over budget.
+
+    pinned is the digest of a dataset just inserted, which has no references
+    yet because its session has not acquired it.
+    """
+    # a referenced dataset stays in memory anyway, so dropping it would only
+    # let the next session to load the same file build a second copy
+    now = time.monotonic()
+    for digest, dataset in list(_cache.items()):
+        if dataset.refs == 0 and digest != pinned and now - dataset.last_used > IDLE_SECONDS:
+            _drop(digest)
+    for digest, dataset in list(_cache.items()):
+        if _cache_bytes <= MAX_CACHE_BYTES or len(_cache) <= 1:
+            break
+        if dataset.refs == 0 and digest != pinned:
+            _drop(digest)
+
+
+def _open(data, name):
+    return io.BytesIO(data) if data is not None else open(name, 'rb')
+
+
+def _stream_snapshot(digest, data, name, on_progress):
+    """Ingest the file chunk by chunk into a snapshot for digest sorted by Order Date; returns its path or None."""
+    streamed = StreamingAggregates()
+
+    def chunks(buffer):
+        for frame, fraction in iter_chunks(buffer, name):
+            streamed.add(frame)
+            if on_progress is not None:
+                on_progress(streamed, fraction)
+            yield frame
+
+    with _open(data, name) as buffer:
+        frames = chunks(buffer)
+        try:
+            path = write_snapshot_chunks(frames, digest)
+        finally:
+            # stop the reader while its buffer is still open
+            frames.close()
+    if path is None or 'Order Date' not in open_snapshot(digest).column_names:
+        return path
+    return sort_snapshot(digest, 'Order Date', CHUNK_ROWS)
+
+
+def _load_table(digest, data, name, on_progress=None):
+    """Map the snapshot for digest, ingesting the raw file into one first if needed."""
+    if has_snapshot(digest):
+        return open_snapshot(digest)
+    size = len(data) if data is not None else os.path.getsize(name)
+    if size >= STREAMING_BYTES and name.lower().endswith(STREAMING_SUFFIXES):
+        try:
+            if _stream_snapshot(digest, data, name, on_progress) is not None:
+                return open_snapshot(digest)
+        except OSError:
+            # read-only deployment: parse in memory below instead
+            pass
+    with _open(data, name) as buffer:
+        frame = parse_superstore(buffer, name)
+    try:
+        write_snapshot(frame, digest)
+    except OSError:
+        # read-only deployment: keep the parsed data in memory instead
+        return pa.Table.from_pandas(frame, preserve_index=False)
+    return open_snapshot(digest)
+
+
+def load_dataset(source=None, on_progress=None):
+    """Return the cached Dataset for source, parsing it on a cache miss.
+
+    source may be a path, a Streamlit UploadedFile (or any file-like object),
+    or None for the file named by SUPERSTORE_DATA_PATH, defaulting to the
+    bundled Sample - Superstore.csv. CSV/TXT uploads go through read_csv and
+    XLSX/XLS through read_excel; CSV/TXT/XLSX files of STREAMING_BYTES or
+    more are streamed, calling on_progress(StreamingAggregates, fraction)
+    after every chunk.
+    """
+    digest, data, name = _read_source(source)
+    dataset = _lookup(digest)
+    if dataset is not None:
+        return dataset
+    return _insert(Dataset(digest, _load_table(digest, data, name, on_progress)))
+
+
+def _lookup(digest):
+    """The cached dataset for digest (counting a hit), or None (counting a miss)."""
+    with _lock:
+        dataset = _cache.get(digest)
+        if dataset is not None:
+            _cache.move_to_end(digest)
+            _stats['hits'] += 1
+            dataset.last_used = time.monotonic()
+            return dataset
+        _stats['misses'] += 1
+        return None
+
+
+def _insert(dataset):
+    """Cache a freshly loaded dataset, unless another session got there first."""
+    global _cache_bytes
+    digest = dataset.digest
+    with _lock:
+        if digest not in _cache:
+            _cache[digest] = dataset
+            _cache_bytes += dataset.nbytes + dataset.derived_nbytes
+            _evict(pinned=digest)
+        return _cache.get(digest, dataset)
+
+
+def _charge(dataset, size):
+    """Count size more bytes derived from dataset, if it is the cached one."""
+    global _cache_bytes
+    with _lock:
+        if _cache.get(dataset.digest) is dataset:
+            _cache_bytes += size
+            _evict(pinned=dataset.digest)
+
+
+def _delta_table(schema, frame):
+    """frame converted to schema, the layout of the dataset it is appended to."""
+    missing = [name for name in schema.names if name not in frame.columns]
+    if missing:
+        raise ValueError(f"appended rows lack the columns {', '.join(missing)}")
+    frame = frame[schema.names].copy()
+    for field in schema:
+        if not pa.types.is_dictionary(field.type) and isinstance(frame[field.name].dtype, pd.CategoricalDtype):
+            # a streamed snapshot stores the categorical columns as strings
+            frame[field.name] = frame[field.name].astype('string')
+    return pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+
+
+def append_dataset(dataset, source, extend=None):
+    """Return dataset with the rows of a delta file appended, cached like a loaded dataset.
+
+    Delta rows whose Row ID (or Order ID, without a Row ID column) is already
+    in dataset or earlier in the delta are dropped. The combined table reuses
+    dataset's columns as they are and converts only the delta; it is kept in
+    memory rather than snapshotted, so a new process starts from the base file
+    again. On a miss, extend(dataset, appended, delta) is called before the
+    result is cached, to carry derived structures over.
+    """
+    delta_digest, data, name = _read_source(source)
+    digest = hashlib.sha256(f'{dataset.digest}+{delta_digest}'.encode()).hexdigest()
+    appended = _lookup(digest)
+    if appended is not None:
+        return appended
+
+    with _open(data, name) as buffer:
+        delta = parse_superstore(buffer, name)
+    key = next((column for column in APPEND_KEYS if column in dataset.columns and column in delta.columns), None)
+    if key is not None:
+        seen = dataset.derive(('row_keys', key), lambda d: SortedRuns(d.select([key])[key].to_numpy()))
+        keys = delta[key].to_numpy()
+        delta = delta[~delta[key].duplicated().to_numpy() & ~seen.contains(keys)].reset_index(drop=True)
+
+    appended = Dataset(digest, pa.concat_tables([dataset.table, _delta_table(dataset.table.schema, delta)]))
+    if key is not None:
+        appended.derive(('row_keys', key), lambda d: seen.extended(delta[key].to_numpy()))
+    if extend is not None:
+        extend(dataset, appended, delta)
+    return _insert(appended)
+
+
+def acquire(dataset):
+    """Count a session's reference to dataset."""
+    with _lock:
+        dataset.refs += 1
+
+
+def release(dataset):
+    """Drop a session's reference to dataset, evicting whatever is now idle."""
+    with _lock:
+        dataset.refs -= 1
+        dataset.last_used = time.monotonic()
+        _evict()
+
+
+def evict_idle():
+    with _lock:
+        _evict()
+
+
+def cached_datasets():
+    """The cached datasets, least recently used first."""
+    with _lock:
+        return list(_cache.values())
+
+
+def cache_stats():
+    """Hit/miss/eviction counters plus the current size of the cache."""
+    with _lock:
+        return dict(_stats, entries=len(_cache), bytes=_cache_bytes)
+
+
+def clear_cache():
+    global _cache_bytes
+    with _lock:
+        _cache.clear()
+        _path_digests.clear()
+        _cache_bytes = 0
+        for key in _stats:
+            _stats[key] = 0
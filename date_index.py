@@ -0,0 +1,68 @@
+"""Binary-search lookup of Order Date ranges.
+
+The loader keeps every dataset sorted by Order Date, so the rows between two
+dates form one contiguous block. DateIndex finds that block with two
+searchsorted calls (O(log n)) and hands it out as a slice, which the filter
+index and DataFrame.iloc consume without building boolean masks or copying
+the frame.
+"""
+
+import numpy as np
+import pandas as pd
+
+from incremental import extended
+
+
+class DateIndex:
+    """Sorted Order Date values of one dataset."""
+
+    def __init__(self, dates):
+        values = pd.Series(dates).to_numpy(dtype='datetime64[ns]')
+        self.n_rows = len(values)
+        # NaT sorts last, so a sorted column with missing dates is still
+        # monotonic over its valid prefix
+        missing = np.isnat(values)
+        n_valid = len(values) - int(np.count_nonzero(missing))
+        head = values[:n_valid]
+        if not missing[:n_valid].any() and np.all(head[1:] >= head[:-1]):
+            self.order = None
+            self.values = head
+        else:
+            # not stored in date order (e.g. a frame built outside the loader)
+            self.order = np.argsort(values, kind='stable')[:n_valid]
+            self.values = values[self.order]
+
+    def extended(self, dates):
+        """This index with dates appended as the next rows, or None unless the rows stay in date order."""
+        values = pd.Series(dates).to_numpy(dtype='datetime64[ns]')
+        missing = np.isnat(values)
+        n_valid = len(values) - int(np.count_nonzero(missing))
+        head = values[:n_valid]
+        in_order = (self.order is None and len(self.values) == self.n_rows and not missing[:n_valid].any()
+                    and np.all(head[1:] >= head[:-1]) and (not n_valid or not len(self.values) or head[0] >= self.values[-1]))
+        if not in_order:
+            return None
+        index = DateIndex([])
+        index.n_rows = self.n_rows + len(values)
+        index.order = None
+        index.values = extended(self.values, head)
+        return index
+
+    @property
+    def min(self):
+        return pd.Timestamp(self.values[0]) if len(self.values) else pd.NaT
+
+    @property
+    def max(self):
+        return pd.Timestamp(self.values[-1]) if len(self.values) else pd.NaT
+
+    def window(self, start, end):
+        """Rows with start <= Order Date <= end.
+
+        A slice for date-sorted data, otherwise a sorted position array.
+        """
+        lo = int(np.searchsorted(self.values, np.datetime64(pd.Timestamp(start), 'ns'), side='left'))
+        hi = int(np.searchsorted(self.values, np.datetime64(pd.Timestamp(end), 'ns'), side='right'))
+        if self.order is None:
+            return slice(lo, max(lo, hi))
+        return np.sort(self.order[lo:hi])
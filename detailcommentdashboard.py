@@ -1,8 +1,18 @@
 import streamlit as st  # Import the Streamlit library for building web apps.
-import plotly.express as px  # Import Plotly Express for creating interactive charts.
 import pandas as pd  # Import pandas for data manipulation and analysis.
 import matplotlib  # Import matplotlib, useful for its colormap features even if not explicitly used for plotting here.
 import warnings  # Import the warnings library to manage warnings.
+import pipeline  # Every stage of a rerun (load, filters, aggregations, figure builds) as a plain function.
+from data_loader import cache_stats  # Hit/miss counters of the shared, cached loader.
+from figure_metrics import log_figure_size  # Hook that logs the serialized size of each figure.
+from scatter import DEFAULT_POINT_BUDGET, MODES  # Point budget and large-selection modes of the scatter plot.
+from time_buckets import GRANULARITIES  # Day/week/month/quarter choices for the time series.
+from view_cache import filter_key  # Key of the filter state the per-session views are built for.
+from shared_store import SessionData, dataset_report, session_report  # Per-session reference to the shared dataset, and memory reports.
+from exports import frame_csv, table_csv  # CSV payloads for the download buttons.
+from data_grid import Gradient, PAGE_SIZES, DEFAULT_PAGE_SIZE, numeric_ranges, page_frame, sorted_rows  # Paginated data grid for View Data.
+from row_selection import selection_size  # Number of rows in a slice or position-array selection.
+from instrumentation import Rerun, SessionStats, profile_summary  # Opt-in per-stage timings for the debug panel.
 
 # Disable all warnings using the warnings library.
 warnings.filterwarnings('ignore')
@@ -10,6 +20,12 @@ warnings.filterwarnings('ignore')
 # Configure the main settings of the Streamlit page, such as title and layout options.
 st.set_page_config(page_title='SuperStore!!!', page_icon=':bar_chart:', layout='wide')
 
+# Start recording this rerun's stages when the app runs with SUPERSTORE_INSTRUMENT=1; the totals per session live in session_state.
+# A 'Profile one rerun' click in the debug panel leaves a flag that runs this rerun under cProfile.
+rerun = Rerun(st.session_state.setdefault('session_stats', SessionStats()), profile=st.session_state.pop('profile_rerun', False))
+# stage(name, fn, *args) calls fn and records it; with instrumentation off it simply calls fn.
+stage = rerun.measure
+
 # Set the title of the web application, including an emoji as part of the title.
 st.title(' :bar_chart: Sample SuperStore EDA')
 
@@ -19,22 +35,71 @@ st.markdown('<style>div.block-container{padding-top:1rem;}</style>', unsafe_allo
 # File uploader that allows users to upload files in specific formats.
 uploaded_file = st.file_uploader(':file_folder: Upload a file', type=['csv', 'txt', 'xlsx', 'xls', 'csv'])
 
-# Conditional that checks if a file has been uploaded.
-if uploaded_file is not None:
-    df = pd.read_csv(uploaded_file)  # If file uploaded, read into a DataFrame.
-else:
-    # Default data loading if no file is uploaded. Path is specific and needs modification for general use.
-    df = pd.read_csv('C:\\Users\\ashra\\Downloads\\VS Code\\streamlit_superstore\\Sample - Superstore.csv')
+# Placeholder for the loading preview; large files are read in chunks and the partial results are drawn here.
+preview = st.empty()
+
+# Called by the loader after every chunk of a large file with the running aggregates and the fraction read so far.
+def show_progress(streamed, fraction):
+    # Aggregates over the rows read so far, in the same form the charts below use.
+    partial = streamed.aggregates()
+    # Replace the previous preview with the current one.
+    with preview.container():
+        # Progress bar with the number of rows read.
+        st.progress(fraction or 0.0, text=f'Loading... {streamed.rows:,} rows so far')
+        # How many regions, states and cities the filters will offer, as far as the file has been read.
+        st.caption(f"{len(streamed.options('Region'))} regions, {len(streamed.options('State'))} states, {len(streamed.options('City'))} cities so far")
+        # Partial category and region charts side by side.
+        p1, p2 = st.columns(2)
+        with p1:
+            # Each chunk's charts need their own key, as they are all drawn during the same run.
+            st.plotly_chart(pipeline.category_bar(partial.category_sales()), use_container_width=True, key=f'preview_category_{streamed.chunks}')
+        with p2:
+            st.plotly_chart(pipeline.region_pie(partial.region_sales()), use_container_width=True, key=f'preview_region_{streamed.chunks}')
+        # Partial monthly sales line.
+        st.plotly_chart(pipeline.time_series_line(partial.monthly_sales(), 'Month'), use_container_width=True, key=f'preview_monthly_{streamed.chunks}')
+
+# Load the uploaded file, or the bundled Sample - Superstore.csv when nothing is uploaded.
+# The loader parses each distinct file once (typed columns, dates already converted) and shares it across sessions.
+# Large files are streamed into the snapshot chunk by chunk, calling show_progress after each chunk.
+# Each stage called through pipeline is the same function benchmarks/bench_pipeline.py times.
+dataset = stage('load', pipeline.load, uploaded_file, show_progress)
+# Remove the loading preview once the whole file is in.
+preview.empty()
+
+# Optional delta files of new orders, appended to the loaded data.
+delta_files = st.sidebar.file_uploader('Append new orders', type=['csv', 'txt', 'xlsx', 'xls'], accept_multiple_files=True, key='delta_file')
+if delta_files:
+    # Remember the size before appending, to count the new orders at the end.
+    base_rows = len(dataset)
+    # Fold the deltas in upload order, each one appended to the result of the previous ones.
+    for delta_file in delta_files:
+        try:
+            # Rows whose Row ID is already in the data (or repeated in the delta) are skipped.
+            # The indexes and totals built so far are updated from the new rows only, and the result is cached like any dataset.
+            dataset = stage('append', pipeline.append, dataset, delta_file)
+        except ValueError as error:
+            # A delta without the dataset's columns cannot be appended; skip it and keep the data appended so far.
+            st.sidebar.error(f'Could not append {delta_file.name}: {error}')
+    # Tell the user how many orders were actually new.
+    st.sidebar.caption(f'{len(dataset) - base_rows:,} new orders appended')
+
+# Sessions share that single read-only copy; each one keeps a counted reference to it (released when the session
+# switches files, goes idle or ends), plus its own filter rows and views.
+session = st.session_state.setdefault('session_data', SessionData())
+dataset = session.use(dataset)
 
 # Split the Streamlit layout into two columns with a specified width ratio.
 col1, col2 = st.columns((2))
 
-# Convert the 'Order Date' column to datetime format, handle errors coercively.
-df['Order Date'] = pd.to_datetime(df['Order Date'], errors='coerce')
-
-# Extract minimum and maximum date from the 'Order Date' column.
-startDate = pd.to_datetime(df['Order Date']).min()
-endDate = pd.to_datetime(df['Order Date']).max()
+# Index the 'Order Date' values once per dataset (sorted, with their row positions) for binary search.
+date_index = stage('date_index', pipeline.date_index, dataset)
+# Extract minimum and maximum date from the sorted 'Order Date' values.
+startDate = date_index.min
+endDate = date_index.max
+# Without a single valid Order Date there is no range to pick and nothing to chart, so stop here.
+if pd.isna(startDate):
+    st.error('The data has no valid Order Date, so there is nothing to chart.')
+    st.stop()
 
 # Create date input widgets in each column for selecting a date range.
 with col1:
@@ -42,53 +107,50 @@ with col1:
 with col2:
     date2 = pd.to_datetime(st.date_input('End Date', endDate))
 
-# Filter the DataFrame based on the selected date range.
-df = df[(df['Order Date'] >= date1) & (df['Order Date'] <= date2)].copy()
+# Find the rows of the selected date range by binary search; the result is a slice, so nothing is copied.
+window = stage('date_window', pipeline.date_window, dataset, date1, date2, rows_in=len(dataset))
 
 # Add a header in the sidebar for filter options.
 st.sidebar.header('Choose your filter: ')
+# Show how often the shared data cache avoided a re-parse.
+stats = cache_stats()
+st.sidebar.caption(f"Data cache: {stats['hits']} hits / {stats['misses']} misses")
+
+# Build (once per dataset, shared by every session) the index mapping each region/state/city to its row positions.
+filter_index = stage('filter_index', pipeline.filter_index, dataset)
+
+# Create a multiselect widget in the sidebar for selecting regions present in the date range.
+region = st.sidebar.multiselect('Pick your region', filter_index.options('Region', window=window))
+
+# Offer only the states of the selected regions (or every state when no region is picked).
+state = st.sidebar.multiselect('Pick the state from selected region', filter_index.options('State', region=region, window=window))
+
+# Similar multiselect for cities, narrowed by the selected states and regions.
+city = st.sidebar.multiselect('Pick the city', filter_index.options('City', region=region, state=state, window=window))
+
+# One index lookup handles every combination of region, state, and city selections without copying the data.
+rows = stage('location_rows', pipeline.location_rows, dataset, region, state, city, window, rows_in=window)
+# The row positions are the only per-session copy of the filtered data.
+session.rows = rows
+# Show how many sessions share the dataset and what this session holds of its own.
+st.sidebar.caption(f'Dataset shared by {dataset.refs} session(s); this session holds {session.nbytes() / 1024:,.1f} KB')
+
+# Expander contents and download payloads are built only when an expander is opened or a download is clicked.
+# Whatever was built is kept in the session and reused until the filter state changes.
+view_cache = session.views
+view_key = filter_key(dataset.digest, window, region, state, city)
 
-# Create a multiselect widget in the sidebar for selecting regions.
-region = st.sidebar.multiselect('Pick your region', df['Region'].unique())
-
-# Conditional filtering based on selected regions.
-if not region:
-    df2 = df.copy()
-else:
-    df2 = df[df['Region'].isin(region)]
-
-# Create another multiselect widget for states based on filtered or unfiltered data.
-state = st.sidebar.multiselect('Pick the state from selected region', df2['State'].unique())
-
-# Further conditional filtering based on selected states.
-if not state:
-    df3 = df2.copy()
-else:
-    df3 = df2[df2['State'].isin(state)]
-
-# Similar multiselect for cities.
-city = st.sidebar.multiselect('Pick the city', df3['City'].unique())
-
-# Comprehensive filtering logic to handle combinations of region, state, and city selections.
-if not region and not state and not city:
-    filtered_df = df
-elif not state and not city:
-    filtered_df = df[df["Region"].isin(region)]
-elif not region and not city:
-    filtered_df = df[df["State"].isin(state)]
-elif state and city:
-    filtered_df = df[(df["State"].isin(state)) & (df["City"].isin(city))]
-elif region and city:
-    filtered_df = df[(df["Region"].isin(region)) & (df["City"].isin(city))]
-elif region and state:
-    filtered_df = df[(df["Region"].isin(region)) & (df["State"].isin(state))]
-elif city:
-    filtered_df = df[df["City"].isin(city)]
-else:
-    filtered_df = df[(df["Region"].isin(region)) & (df["State"].isin(state)) & (df["City"].isin(city))]
-
-# Group the filtered DataFrame by 'Category' and calculate the sum of 'Sales'.
-category_df = filtered_df.groupby(by=['Category'], as_index=False)['Sales'].sum()
+# Return the view cached under name for the current filters, building it on first use.
+def lazy(name, build):
+    return view_cache.get(view_key, name, build)
+
+# Aggregate the filtered rows once, over integer-coded dimensions, into a small cube of sums.
+# Every chart and table below is derived from this cube instead of rescanning the rows.
+# The integer codes and float measures it groups are built once per dataset.
+aggregates = stage('aggregate', pipeline.aggregate_rows, dataset, rows, rows_in=rows)
+
+# Sum of 'Sales' per 'Category', taken from the cube.
+category_df = stage('category_sales', aggregates.category_sales)
 
 # Plotting and display logic follows similar patterns, involving Plotly charts and Streamlit widgets for interactivity and data visualization.
 # Further code is focused on plotting, displaying, and downloading various visualizations and data sets as per user selections.
@@ -96,18 +158,22 @@ category_df = filtered_df.groupby(by=['Category'], as_index=False)['Sales'].sum(
 with col1:
     # Display a subheader for a specific visualization category.
     st.subheader('Category wise Sales')
-    # Create a bar chart using Plotly Express for sales by category.
-    fig = px.bar(category_df, x='Category', y='Sales', text=['${:,.2f}'.format(x) for x in category_df['Sales']], template='seaborn')
+    # Create a bar chart using Plotly Express for sales by category, each bar labelled with its dollar amount.
+    fig = stage('category_bar', pipeline.category_bar, category_df)
+    # Log the size of the chart payload sent to the browser (when figure-size logging is enabled).
+    log_figure_size('category_bar', fig)
     # Display the bar chart within the Streamlit container and adjust its width to match the container's width.
     st.plotly_chart(fig, use_container_width=True, height=200)
 
 with col2:
     # Display a subheader for region-wise sales.
     st.subheader('Region wise Sales')
-    # Create a pie chart using Plotly Express to display sales by region.
-    fig = px.pie(filtered_df, values='Sales', names='Region', hole=0.5)
-    # Update the text labels to display outside of the chart elements.
-    fig.update_traces(text=filtered_df['Region'], textposition='outside')
+    # Sales per region from the cube: one slice per region, so the chart payload does not grow with the rows.
+    region_df = stage('region_sales', aggregates.region_sales)
+    # Create a donut chart using Plotly Express to display sales by region, each slice labelled outside with its region.
+    fig = stage('region_pie', pipeline.region_pie, region_df)
+    # Log its payload size.
+    log_figure_size('region_pie', fig)
     # Display the pie chart in the Streamlit app, matching the container's width.
     st.plotly_chart(fig, use_container_width=True)
 
@@ -116,57 +182,62 @@ cl1, cl2 = st.columns(2)
 
 with cl1:
     # Use an expander to toggle visibility of category data and download option.
-    with st.expander("Category_ViewData"):
-        # Apply a background gradient to the category DataFrame display.
-        st.write(category_df.style.background_gradient(cmap='Blues'))
-        # Convert the category DataFrame to a CSV format.
-        csv_category = category_df.to_csv(index=False).encode('utf-8')
-        # Provide a button to download the category data as CSV.
-        st.download_button('Download Data', data=csv_category, file_name='Category.csv', mime='text/csv', help='Click here to download csv')
+    # on_change='rerun' makes the expander report whether it is open, so its contents are only built when visible.
+    category_expander = st.expander("Category_ViewData", key='category_expander', on_change='rerun')
+    if category_expander.open:
+        with category_expander:
+            # Apply a background gradient to the category DataFrame display.
+            stage('category_table', st.write, lazy('category_style', lambda: category_df.style.background_gradient(cmap='Blues')))
+            # Provide a button to download the category data as CSV; the CSV is only generated when clicked.
+            st.download_button('Download Data', data=lambda: lazy('category_csv', lambda: frame_csv(category_df)), file_name='Category.csv', mime='text/csv', help='Click here to download csv')
 
 with cl2:
-    # Similar expander setup for region data viewing and downloading.
-    with st.expander("Region_ViewData"):
-        # Group data by 'Region' and sum up the sales, displaying it with a style.
-        region = filtered_df.groupby(by='Region', as_index=False)['Sales'].sum()
-        st.write(region.style.background_gradient(cmap='Oranges'))
-        # Convert the grouped data to CSV format for download.
-        csv_region = region.to_csv(index=False).encode('utf-8')
-        # Download button for region data.
-        st.download_button('Download Data', data=csv_region, file_name='Region.csv', mime='text/csv', help='Click here to download csv')
-
-# Convert 'Order Date' to a Period object at a monthly frequency, adding as a new column.
-filtered_df['month_year'] = filtered_df['Order Date'].dt.to_period('M')
+    # Similar lazy expander setup for region data viewing and downloading.
+    region_expander = st.expander("Region_ViewData", key='region_expander', on_change='rerun')
+    if region_expander.open:
+        with region_expander:
+            # Display the region totals used by the pie chart with a style.
+            stage('region_table', st.write, lazy('region_style', lambda: region_df.style.background_gradient(cmap='Oranges')))
+            # Download button for region data, generated on click.
+            st.download_button('Download Data', data=lambda: lazy('region_csv', lambda: frame_csv(region_df)), file_name='Region.csv', mime='text/csv', help='Click here to download csv')
 
 # Display a subheader for time series analysis.
 st.subheader('Time Series Analysis')
 
-# Aggregate sales data by month and year, and reset index for plotting.
-linechart = pd.DataFrame(filtered_df.groupby(filtered_df['month_year'].dt.strftime('%Y : %b'))['Sales'].sum()).reset_index()
+# Let the user pick the time bucket size, monthly by default.
+granularity = st.radio('Granularity', GRANULARITIES, index=GRANULARITIES.index('Month'), horizontal=True)
+
+# Sales per bucket, grouped on integer bucket codes that are computed once per dataset and granularity.
+# Buckets stay in calendar order, and only the output buckets are formatted as labels (e.g. '2015 : Jan').
+linechart = stage('time_series', pipeline.time_series, dataset, aggregates, granularity)
 
 # Create a line chart with Plotly Express to visualize sales over time.
-fig2 = px.line(linechart, x='month_year', y='Sales', labels={'Sales': 'Amount'}, height=500, width=1000, template='gridon')
+fig2 = stage('time_series_line', pipeline.time_series_line, linechart, granularity)
+# Log its payload size.
+log_figure_size('time_series', fig2)
 # Display the line chart in Streamlit, using the full width of the container.
 st.plotly_chart(fig2, use_container_width=True)
 
-# Data viewing and downloading for time series data within an expander.
-with st.expander('View Data of TimeSeries: '):
-    # Apply a background gradient to the transposed line chart data for display.
-    st.write(linechart.T.style.background_gradient(cmap = 'Blues'))
-    # Convert the line chart data to CSV format for downloading.
-    csv = linechart.to_csv(index=False).encode('utf-8')
-    # Provide a button to download the time series data as CSV.
-    st.download_button('Download Data', data = csv, file_name= 'TimeSeries.csv', mime = 'text/csv')
+# Data viewing and downloading for time series data within an expander, built only when it is open.
+timeseries_expander = st.expander('View Data of TimeSeries: ', key='timeseries_expander', on_change='rerun')
+if timeseries_expander.open:
+    with timeseries_expander:
+        # Transpose the line chart data for Month/Quarter only; Day/Week have too many buckets to show one column per bucket.
+        timeseries_table = linechart.T if granularity in ('Month', 'Quarter') else linechart
+        # Apply a background gradient to the table for display (cached per granularity).
+        stage('time_series_table', st.write, lazy(('timeseries_style', granularity), lambda: timeseries_table.style.background_gradient(cmap = 'Blues')))
+        # Provide a button to download the time series data as CSV, generated when clicked.
+        st.download_button('Download Data', data = lambda: lazy(('timeseries_csv', granularity), lambda: frame_csv(linechart)), file_name= 'TimeSeries.csv', mime = 'text/csv')
 
 # Continue with additional visualizations and functionalities in a similar detailed manner.
 
 # Tree map visualization to provide a hierarchical view of sales data.
 st.subheader('Hirearcial view of sales using Tree Map')
-# Create a tree map with Plotly Express using the filtered DataFrame.
+# Create an 800x650 tree map with Plotly Express from the pre-aggregated Region / Category / Sub-Category sales.
 # Paths determine the hierarchy of aggregation: first by Region, then Category, then Sub-Category.
-fig3 = px.treemap(filtered_df, path=['Region', 'Category', 'Sub-Category'], values='Sales', hover_data=['Sales'], color='Sub-Category')
-# Customize the layout dimensions of the tree map.
-fig3.update_layout(width=800, height=650)
+fig3 = stage('treemap', pipeline.treemap, stage('hierarchy_sales', aggregates.hierarchy_sales))
+# Log its payload size.
+log_figure_size('treemap', fig3)
 # Display the tree map in the Streamlit app, using the container's width.
 st.plotly_chart(fig3, use_container_width=True)
 
@@ -176,58 +247,126 @@ chart1, chart2 = st.columns((2))
 with chart1:
     # Display a subheader for segment-wise sales visualization.
     st.subheader('Segment wise sales')
-    # Create a pie chart for sales data by segment using Plotly Express.
-    fig = px.pie(filtered_df, values='Sales', names='Segment', template='plotly_dark')
-    # Update text labels to appear inside the chart slices.
-    fig.update_traces(text=filtered_df['Segment'], textposition='inside')
+    # Sales per segment from the cube.
+    segment_df = stage('segment_sales', aggregates.segment_sales)
+    # Create a pie chart for sales data by segment using Plotly Express, each slice labelled inside with its segment.
+    fig = stage('segment_pie', pipeline.segment_pie, segment_df)
+    # Log its payload size.
+    log_figure_size('segment_pie', fig)
     # Display the pie chart within the Streamlit container.
     st.plotly_chart(fig, use_container_width=True)
 
 with chart2:
     # Display a subheader for category-wise sales visualization.
     st.subheader('Category wise sales')
-    # Create another pie chart for sales data by category using Plotly Express.
-    fig = px.pie(filtered_df, values='Sales', names='Category', template='gridon')
-    # Update text labels to appear inside the chart slices.
-    fig.update_traces(text=filtered_df['Category'], textposition='inside')
+    # Create another pie chart for sales data by category, reusing the category totals of the bar chart.
+    fig = stage('category_pie', pipeline.category_pie, category_df)
+    # Log its payload size.
+    log_figure_size('category_pie', fig)
     # Display the pie chart within the Streamlit container.
     st.plotly_chart(fig, use_container_width=True)
 
-# Importing Plotly Figure Factory, used for creating styled data tables.
-import plotly.figure_factory as ff
 # Display a subheader indicating the month-wise sub-category sales summary.
 st.subheader(':point_right: Month wise sub-category sales summary')
-# An expander for showing summary tables and enabling interaction.
-with st.expander('Summary_Table'):
-    # Sample data from the DataFrame for summary purposes.
-    df_sample = df[0:5][['Region', 'State', 'City', 'Category', 'Sales', 'Profit', 'Quantity']]
-    # Create a table using Figure Factory, which offers more styling options.
-    fig = ff.create_table(df_sample, colorscale='Cividis')
-    # Display the created table within the Streamlit app.
-    st.plotly_chart(fig, use_container_width=True)
-
-    # Additional markdown for clarifying the content of the summary.
-    st.markdown('Month wise sub-Cateogry table')
-    # Pivot table to analyze sub-category sales across different months.
-    filtered_df['Month'] = filtered_df['Order Date'].dt.month_name()  # Extract the month name from the date.
-    sub_category_year = pd.pivot_table(data=filtered_df, values='Sales', index=['Sub-Category'], columns='Month')
-    # Display the pivot table with a style.
-    st.write(sub_category_year.style.background_gradient(cmap='Blues'))
+# An expander for showing summary tables; the table figure and the pivot are only built while it is open.
+summary_expander = st.expander('Summary_Table', key='summary_expander', on_change='rerun')
+if summary_expander.open:
+    with summary_expander:
+        # Create a Figure Factory table of the first five orders in the date range, which offers more styling options.
+        fig = lazy('summary_table', lambda: stage('summary_table', pipeline.summary_table, dataset, window))
+        # Log its payload size.
+        log_figure_size('summary_table', fig)
+        # Display the created table within the Streamlit app.
+        st.plotly_chart(fig, use_container_width=True)
+
+        # Additional markdown for clarifying the content of the summary.
+        st.markdown('Month wise sub-Cateogry table')
+        # Pivot of average sub-category sales per month name, derived from the cube.
+        sub_category_year = lazy('subcategory_month', lambda: stage('subcategory_month_sales', aggregates.subcategory_month_sales))
+        # Display the pivot table with a style.
+        stage('subcategory_month_table', st.write, lazy('subcategory_month_style', lambda: sub_category_year.style.background_gradient(cmap='Blues')))
+
+# Sidebar settings for the scatter plot: how many orders to draw individually, and what to do above that.
+st.sidebar.subheader('Scatter plot')
+point_budget = st.sidebar.number_input('Point budget', min_value=100, value=DEFAULT_POINT_BUDGET, step=500)
+scatter_mode = st.sidebar.radio('Above the budget', MODES, format_func={'bin': 'Density grid', 'sample': 'Sample (keeps outliers)'}.get)
 
 # Scatter plot to analyze the relationship between sales and profits.
-data1 = px.scatter(filtered_df, x='Sales', y="Profit", size='Quantity', labels={'Sales': 'Total Sales', 'Profit': 'Total Profit'})
-# Update the layout to include titles and font sizes for better readability.
-data1['layout'].update(title='Relationship Between sales and profits using scatter plot', titlefont=dict(size=20),
-                       xaxis=dict(title='Sales', titlefont=dict(size=19)),
-                       yaxis=dict(title='Profit', titlefont=dict(size=19)))
+# Below the budget every order is a marker; above it the orders are binned into a Quantity heatmap or sampled, on the server.
+# The figure comes back with its titles and font sizes set for better readability.
+data1, represented, rendered = stage('scatter', pipeline.scatter, dataset, rows, point_budget, scatter_mode, {'Sales': 'Total Sales', 'Profit': 'Total Profit'}, rows_in=rows)
+# Log its payload size.
+log_figure_size('scatter', data1)
 # Display the scatter plot in the Streamlit app, using the container's width.
 st.plotly_chart(data1, use_container_width=True)
-
-# An expander for viewing data and providing a downloadable link.
-with st.expander('View Data'):
-    # Display a portion of the filtered data styled with a background gradient.
-    st.write(filtered_df.iloc[:500, 1:20:2].style.background_gradient(cmap='Oranges'))  # Showing only top 500 rows, skipping some columns for brevity.
-
-# Option to download the entire dataset with the applied selections.
-csv = df.to_csv(index=False).encode('utf-8')
-st.download_button('Download Data', data=csv, file_name='Data.csv', mime='text/csv')
+# Orders without a finite Sales or Profit (e.g. blank cells in an upload) cannot be placed on the chart.
+unplaced = selection_size(rows, len(dataset)) - represented
+# Tell the user how many orders the chart represents versus how many points or bins it draws, and how many were left out.
+st.caption((f'Showing {rendered:,} of {represented:,} orders' if rendered == represented or scatter_mode == 'sample' else f'{represented:,} orders binned into {rendered:,} grid cells')
+           + (f' ({unplaced:,} without Sales or Profit left out)' if unplaced else ''))
+
+# An expander for browsing the filtered data page by page, only filled while it is open.
+view_expander = st.expander('View Data', key='view_expander', on_change='rerun')
+if view_expander.open:
+    with view_expander:
+        # Let the user pick the columns to show; every other column of the dataset by default.
+        grid_columns = st.multiselect('Columns', dataset.columns, default=dataset.columns[1:20:2], key='grid_columns')
+        # Three side-by-side controls for sorting and page size.
+        g1, g2, g3 = st.columns(3)
+        with g1:
+            # Column to sort the filtered rows by; nothing selected keeps the row order.
+            sort_column = st.selectbox('Sort by', grid_columns, index=None, placeholder='Row order', key='grid_sort')
+        with g2:
+            # Number of rows shown per page.
+            page_size = st.selectbox('Rows per page', PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE), key='grid_page_size')
+        with g3:
+            # Toggle for a descending sort.
+            descending = st.toggle('Descending', key='grid_descending')
+
+        # Count the filtered rows and the pages they span.
+        total = selection_size(rows, len(dataset))
+        pages = max(1, -(-total // page_size))
+        # Pull the page number back in range if the filters now select fewer rows.
+        if st.session_state.get('grid_page', 1) > pages:
+            st.session_state['grid_page'] = pages
+        # Page picker (1-based for the user, 0-based below).
+        page = st.number_input(f'Page (of {pages:,})', min_value=1, max_value=pages, step=1, key='grid_page') - 1
+
+        # Order the filtered rows server-side, once per filter state and sort choice.
+        ordered = rows if sort_column is None else lazy(('grid_order', sort_column, descending), lambda: stage('grid_sort', sorted_rows, dataset, rows, sort_column, not descending, rows_in=rows))
+        # Colour ranges of the numeric columns over all filtered rows, so colours are comparable across pages.
+        gradient = lazy(('grid_gradient', tuple(grid_columns)), lambda: Gradient('Oranges', numeric_ranges(dataset, rows, grid_columns)))
+        # Fetch just this page from the snapshot.
+        page_df = stage('grid_page', page_frame, dataset, ordered, grid_columns, page, page_size, rows_in=total)
+        # Show the page with its precomputed background gradient.
+        stage('grid_table', st.dataframe, page_df.style.apply(gradient.css, axis=None))
+        # Tell the user which rows they are looking at.
+        st.caption(f'Rows {min(page * page_size + 1, total):,}-{min((page + 1) * page_size, total):,} of {total:,}')
+
+# Option to download the entire dataset with the applied selections (all columns of the rows in the selected date range).
+# The CSV is generated only when the button is clicked, streamed from the columnar snapshot one chunk at a time.
+st.download_button('Download Data', data=lambda: table_csv(dataset.table, window), file_name='Data.csv', mime='text/csv')
+
+# Debug panel, only when instrumentation is on: close the rerun (which also appends it to the rolling JSON-lines log) and show its stages.
+if rerun.enabled:
+    record = rerun.finish()
+    # A collapsible sidebar panel keeps the numbers out of the way.
+    with st.sidebar.expander('Debug: stage timings'):
+        # Total time of this rerun.
+        st.caption(f"Rerun {record['rerun']} of session {record['session']}: {record['total_ms']:,.0f} ms")
+        # One row per stage: wall time, rows in/out, allocations and figure size.
+        st.dataframe(rerun.frame(), hide_index=True)
+        # The same stages summed over every rerun of this session.
+        st.caption('This session, per stage')
+        st.dataframe(rerun.session.frame(), hide_index=True)
+        # Memory of every shared dataset (snapshot and derived indexes) and of every session's own rows and views.
+        st.caption('Shared datasets')
+        st.dataframe(dataset_report(), hide_index=True)
+        st.caption('Sessions')
+        st.dataframe(session_report(), hide_index=True)
+        # Clicking reruns the app, and that rerun runs under cProfile.
+        st.button('Profile one rerun', help='Runs the next rerun under cProfile', on_click=lambda: st.session_state.update(profile_rerun=True))
+        # After a profiled rerun, show its top functions and offer the dump for snakeviz/pstats.
+        if rerun.profile_path:
+            st.code(profile_summary(rerun.profile_path))
+            st.download_button('Download cProfile dump', data=rerun.profile_bytes(), file_name='rerun.prof')
\ No newline at end of file
@@ -0,0 +1,75 @@
+"""CSV payloads for the download buttons.
+
+The full-dataset export streams straight from the columnar snapshot: rows are
+converted and written one chunk at a time, so exporting never builds a second
+DataFrame of the whole selection (nor its CSV text next to its encoded bytes).
+"""
+
+import io
+
+import numpy as np
+
+CHUNK_ROWS = 50_000
+
+
+def frame_csv(frame):
+    """Small, already aggregated frames: one to_csv call."""
+    return frame.to_csv(index=False).encode('utf-8')
+
+
+def iter_csv_chunks(table, rows=slice(None), chunk_rows=CHUNK_ROWS):
+    """Yield the CSV of table's rows (a slice or sorted positions), chunk by chunk."""
+    if isinstance(rows, slice):
+        start, stop, _ = rows.indices(table.num_rows)
+        chunks = (table.slice(offset, min(chunk_rows, stop - offset)) for offset in range(start, stop, chunk_rows))
+    else:
+        rows = np.asarray(rows)
+        chunks = (table.take(rows[offset:offset + chunk_rows]) for offset in range(0, len(rows), chunk_rows))
+    header = True
+    for chunk in chunks:
+        yield chunk.to_pandas().to_csv(index=False, header=header).encode('utf-8')
+        header = False
+    if header:
+        # empty selection: still a valid CSV with the column names
+        yield (','.join(table.column_names) + '\n').encode('utf-8')
+
+
+class ChunkedCsv(io.RawIOBase):
+    """Read-only, forward-only file object over iter_csv_chunks(), for st.download_button."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b'')
+        self._started = False
+
+    def readable(self):
+        return True
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        # st.download_button rewinds file objects before reading them
+        if offset == 0 and whence == io.SEEK_SET and not self._started:
+            return 0
+        raise io.UnsupportedOperation('ChunkedCsv can only be read once, from the start')
+
+    def readinto(self, buffer):
+        self._started = True
+        while not len(self._pending):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
+
+    def readall(self):
+        self._started = True
+        rest = bytes(self._pending)
+        self._pending = memoryview(b'')
+        return rest + b''.join(self._chunks)
+
+
+def table_csv(table, rows=slice(None)):
+    """File object streaming the CSV of the given rows of a snapshot table."""
+    return ChunkedCsv(iter_csv_chunks(table, rows))
@@ -0,0 +1,35 @@
+"""Measurement hook for the size of the figures sent to the browser.
+
+Every st.plotly_chart call ships the figure as JSON, so the payload size is
+what each chart costs in bandwidth per rerun. log_figure_size() serializes
+the figure the same way and logs its byte size. Serializing is not free, so
+it only runs when the 'superstore.figures' logger is enabled for INFO, e.g.
+by starting the app with SUPERSTORE_LOG_FIGURE_SIZES=1.
+"""
+
+import logging
+import os
+
+import plotly.io as pio
+
+logger = logging.getLogger('superstore.figures')
+
+if os.environ.get('SUPERSTORE_LOG_FIGURE_SIZES') == '1' and not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+
+
+def figure_bytes(fig):
+    """Size in bytes of the figure's JSON, as sent to the browser."""
+    return len(pio.to_json(fig, validate=False).encode('utf-8'))
+
+
+def log_figure_size(name, fig):
+    """Log the serialized size of fig under name; returns the size (None when disabled)."""
+    if not logger.isEnabledFor(logging.INFO):
+        return None
+    size = figure_bytes(fig)
+    logger.info('%s: %d bytes (%d traces)', name, size, len(fig.data))
+    return size
@@ -0,0 +1,203 @@
+"""Precomputed index for the Region -> State -> City sidebar cascade.
+
+Built once per dataset, the index maps every Region/State/City code to the
+sorted positions of its rows and records which (region, state) and
+(state, city) pairs occur. Option lists and the final row selection are then
+answered from those arrays instead of scanning and copying the frame on every
+rerun.
+
+Row selections are either a slice (a contiguous window, e.g. a date range) or
+a sorted array of row positions; both can be passed straight to DataFrame.iloc.
+"""
+
+import copy
+
+import numpy as np
+import pandas as pd
+
+from incremental import extended
+
+LEVELS = ('Region', 'State', 'City')
+
+
+def category_codes(column):
+    """(codes, labels) of a column as a categorical with sorted labels; missing values get code -1."""
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype('category')
+    elif not column.cat.categories.is_monotonic_increasing:
+        # e.g. an appended dataset whose delta brought new labels
+        column = column.cat.reorder_categories(column.cat.categories.sort_values())
+    return column.cat.codes.to_numpy(), list(column.cat.categories)
+
+
+def _group_positions(codes, size):
+    """Sorted row positions of every code in 0..size-1 (missing values skipped)."""
+    order = np.argsort(codes, kind='stable')
+    order = order[codes[order] >= 0]
+    counts = np.bincount(codes[order], minlength=size)
+    return np.split(order, np.cumsum(counts)[:-1])
+
+
+def _appended_groups(groups, codes, start):
+    """groups with rows start, start + 1, ... (one per code, -1 skipped) appended."""
+    groups = list(groups)
+    new = _group_positions(codes, len(groups))
+    for code in np.unique(codes[codes >= 0]):
+        groups[code] = extended(groups[code], new[code] + start)
+    return groups
+
+
+class FilterIndex:
+    """Row positions and hierarchy of the Region/State/City columns of one dataset."""
+
+    def __init__(self, frame):
+        self.n_rows = len(frame)
+        self.codes = {}
+        self.labels = {}
+        self.lookup = {}
+        self.positions = {}
+        for level in LEVELS:
+            codes, labels = category_codes(frame[level])
+            self.codes[level] = codes
+            self.labels[level] = labels
+            self.lookup[level] = {label: code for code, label in enumerate(labels)}
+            self.positions[level] = _group_positions(codes, len(labels))
+
+        # (parent, child) pairs that occur in the data, each with its rows, so
+        # that option lists respect both the hierarchy and the active window
+        self.pairs = {}
+        self.pair_positions = {}
+        self.children = {}
+        for parent, child in zip(LEVELS, LEVELS[1:]):
+            n_child = len(self.labels[child])
+            keys = self.codes[parent].astype(np.int64) * n_child + self.codes[child]
+            keys[(self.codes[parent] < 0) | (self.codes[child] < 0)] = -1
+            pair_keys, inverse = np.unique(keys, return_inverse=True)
+            valid = pair_keys >= 0
+            groups = _group_positions(np.where(valid[inverse], inverse, -1), len(pair_keys))
+            pair_keys = pair_keys[valid]
+            self.pairs[child] = np.column_stack((pair_keys // n_child, pair_keys % n_child))
+            self.pair_positions[child] = [group for group, ok in zip(groups, valid) if ok]
+            self.children[parent] = {
+                code: self.pairs[child][self.pairs[child][:, 0] == code, 1]
+                for code in range(len(self.labels[parent]))
+            }
+
+    def extended(self, frame):
+        """This index with frame's rows appended after the current ones.
+
+        Returns None when the rows bring a label or a (parent, child) pair the
+        index has not seen, as those change the codes and option lists.
+        """
+        codes = {}
+        for level in LEVELS:
+            # -1 for missing values and for labels the index has not seen
+            level_codes = pd.Index(self.labels[level]).get_indexer(frame[level]).astype(np.int64)
+            if ((level_codes < 0) & frame[level].notna().to_numpy()).any():
+                return None
+            codes[level] = level_codes
+        pair_codes = {}
+        for parent, child in zip(LEVELS, LEVELS[1:]):
+            n_child = len(self.labels[child])
+            known = self.pairs[child][:, 0] * n_child + self.pairs[child][:, 1]
+            both = (codes[parent] >= 0) & (codes[child] >= 0)
+            keys = codes[parent][both] * n_child + codes[child][both]
+            at = np.searchsorted(known, keys)
+            if (at >= len(known)).any() or (known[at] != keys).any():
+                return None
+            pair_codes[child] = np.full(len(frame), -1, dtype=np.int64)
+            pair_codes[child][both] = at
+
+        index = copy.copy(self)
+        index.n_rows = self.n_rows + len(frame)
+        index.codes = {level: extended(self.codes[level], codes[level]) for level in LEVELS}
+        index.positions = {level: _appended_groups(self.positions[level], codes[level], self.n_rows) for level in LEVELS}
+        index.pair_positions = {child: _appended_groups(self.pair_positions[child], pair_codes[child], self.n_rows) for child in LEVELS[1:]}
+        return index
+
+    def _selected(self, level, labels):
+        lookup = self.lookup[level]
+        return np.array([lookup[label] for label in labels if label in lookup], dtype=np.int64)
+
+    def _allowed(self, level, labels):
+        allowed = np.zeros(len(self.labels[level]), dtype=bool)
+        allowed[self._selected(level, labels)] = True
+        return allowed
+
+    def _window_mask(self, window):
+        if window is None or isinstance(window, slice):
+            return None
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[window] = True
+        return mask
+
+    def _present(self, positions, window, mask):
+        """Whether any of the sorted positions fall inside window."""
+        if window is None:
+            return len(positions) > 0
+        if mask is not None:
+            return bool(mask[positions].any())
+        start, stop, _ = window.indices(self.n_rows)
+        i = np.searchsorted(positions, start)
+        return i < len(positions) and positions[i] < stop
+
+    def options(self, level, region=(), state=(), window=None):
+        """Labels offered for level given the selections above it.
+
+        Mirrors the original cascade: regions present in the window, states of
+        the selected regions (or all states), and cities of the selected states
+        (or of the selected regions, or all cities), all restricted to the window.
+        """
+        mask = self._window_mask(window)
+        labels = self.labels[level]
+        if level == 'Region':
+            present = [code for code, positions in enumerate(self.positions[level]) if self._present(positions, window, mask)]
+            return [labels[code] for code in present]
+
+        pairs = self.pairs[level]
+        keep = np.ones(len(pairs), dtype=bool)
+        if level == 'State' and region:
+            keep &= self._allowed('Region', region)[pairs[:, 0]]
+        if level == 'City':
+            if state:
+                keep &= self._allowed('State', state)[pairs[:, 0]]
+            if region:
+                states = self.pairs['State']
+                states = states[self._allowed('Region', region)[states[:, 0]], 1]
+                allowed_states = np.zeros(len(self.labels['State']), dtype=bool)
+                allowed_states[states] = True
+                keep &= allowed_states[pairs[:, 0]]
+        present = {
+            int(pairs[i, 1]) for i in np.flatnonzero(keep)
+            if self._present(self.pair_positions[level][i], window, mask)
+        }
+        return [labels[code] for code in sorted(present)]
+
+    def rows(self, region=(), state=(), city=(), window=None):
+        """Row positions matching every non-empty selection, inside window.
+
+        Returns window itself (a slice, an array, or slice(None) for all rows)
+        when nothing is selected, otherwise a sorted position array.
+        """
+        if window is None:
+            window = slice(None)
+        selections = [(level, labels) for level, labels in zip(LEVELS, (region, state, city)) if labels]
+        if not selections:
+            return window
+
+        # start from the smallest selected level and check the others by code
+        candidates = []
+        for level, labels in selections:
+            codes = self._selected(level, labels)
+            candidates.append((sum(len(self.positions[level][code]) for code in codes), level, codes))
+        _, start_level, start_codes = min(candidates, key=lambda item: item[0])
+        rows = np.sort(np.concatenate([self.positions[start_level][code] for code in start_codes] or [np.empty(0, dtype=np.int64)]))
+        for level, labels in selections:
+            if level != start_level:
+                rows = rows[self._allowed(level, labels)[self.codes[level][rows]]]
+
+        if isinstance(window, slice):
+            start, stop, _ = window.indices(self.n_rows)
+            return rows[np.searchsorted(rows, start):np.searchsorted(rows, stop)]
+        mask = self._window_mask(window)
+        return rows[mask[rows]]
@@ -0,0 +1,79 @@
+"""Building blocks for appending rows to a dataset without rebuilding it.
+
+An appended dataset is a new Dataset, so the structures derived from the
+base (indexes, codes, totals) must stay valid for sessions still using it.
+extended() appends to a column without touching the base's view of it, and
+costs only the new values in the common case of a feed growing one delta at
+a time; SortedRuns answers "is this key already there?" for deduplication.
+"""
+
+import threading
+import weakref
+
+import numpy as np
+import pandas as pd
+
+# id(buffer) -> length of the prefix of buffer handed out by extended()
+_filled = {}
+_lock = threading.Lock()
+
+
+def extended(array, values):
+    """array followed by values, as a new array.
+
+    The result is a view of a buffer with spare capacity. Extending the
+    latest result again writes into that capacity, so a column grown one
+    delta at a time costs amortized O(len(values)); extending anything else
+    (or past the capacity) copies array once. The arrays handed out before
+    are never modified.
+    """
+    values = np.asarray(values, dtype=array.dtype)
+    n = len(array)
+    total = n + len(values)
+    buffer = array.base
+    with _lock:
+        if (isinstance(buffer, np.ndarray) and _filled.get(id(buffer)) == n and total <= len(buffer)
+                and array.__array_interface__['data'][0] == buffer.__array_interface__['data'][0]):
+            buffer[n:total] = values
+        else:
+            buffer = np.empty(total + total // 4 + 256, dtype=array.dtype)
+            buffer[:n] = array
+            buffer[n:total] = values
+            weakref.finalize(buffer, _filled.pop, id(buffer), None)
+        _filled[id(buffer)] = total
+    return buffer[:total]
+
+
+class SortedRuns:
+    """A set of keys kept as a few sorted arrays, for membership tests of delta keys.
+
+    Adding keys appends a sorted run and merges runs of similar size, so
+    adding d keys costs O(d log n) amortized instead of re-sorting everything.
+    Missing keys are never members.
+    """
+
+    def __init__(self, keys, runs=()):
+        keys = np.asarray(keys)
+        keys = np.sort(keys[~pd.isna(keys)])
+        self.runs = list(runs)
+        if len(keys):
+            self.runs.append(keys)
+        while len(self.runs) > 1 and len(self.runs[-2]) <= 2 * len(self.runs[-1]):
+            last = self.runs.pop()
+            self.runs[-1] = np.sort(np.concatenate([self.runs[-1], last]), kind='stable')
+
+    def contains(self, keys):
+        """Boolean mask of the keys already present."""
+        keys = np.asarray(keys)
+        found = np.zeros(len(keys), dtype=bool)
+        valid = ~pd.isna(keys)
+        for run in self.runs:
+            at = np.searchsorted(run, keys[valid])
+            hit = at < len(run)
+            hit[hit] = run[at[hit]] == keys[valid][hit]
+            found[valid] |= hit
+        return found
+
+    def extended(self, keys):
+        """A new set with keys added; this one is left as it is."""
+        return SortedRuns(keys, self.runs)
@@ -0,0 +1,220 @@
+"""Opt-in per-stage instrumentation of dashboard reruns.
+
+Start the app with SUPERSTORE_INSTRUMENT=1 to turn it on. Each stage the
+dashboards run goes through Rerun.measure(name, fn, *args), which records:
+
+* wall time;
+* rows in (when given) and rows out (length of the returned frame, array or
+  row selection; groups in an aggregated cube);
+* memory allocated by the stage, net and peak, from tracemalloc;
+* the serialized size of a returned Plotly figure.
+
+A rerun's records are summed per stage into the session's SessionStats and
+appended as one JSON line to a rolling log (SUPERSTORE_INSTRUMENT_DIR,
+default .instrument/ in the repository). A single rerun can also be run under
+cProfile, and its dump is written next to the log. A rerun that never
+reaches finish() (interrupted by a widget change, or raising) has its
+profiler stopped when the session's next rerun starts, or when the rerun is
+garbage collected, and the session's next rerun is profiled instead.
+
+When instrumentation is off, measure() just calls fn. tracemalloc and the log
+are process-wide, so with several sessions rerunning at once the allocation
+figures include the other sessions' work.
+"""
+
+import cProfile
+import io
+import json
+import logging
+import logging.handlers
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+import uuid
+import weakref
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objects as go
+
+from aggregations import Aggregates
+from data_loader import Dataset
+from figure_metrics import figure_bytes
+
+ENABLED = os.environ.get('SUPERSTORE_INSTRUMENT') == '1'
+LOG_DIR = os.environ.get('SUPERSTORE_INSTRUMENT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.instrument'))
+LOG_FILE = 'reruns.jsonl'
+# the log rolls over to reruns.jsonl.1 .. .3 at this size
+LOG_MAX_BYTES = 5 * 1024 ** 2
+LOG_BACKUPS = 3
+
+logger = logging.getLogger('superstore.instrument')
+_logger_lock = threading.Lock()
+
+
+def _log():
+    with _logger_lock:
+        if not logger.handlers:
+            os.makedirs(LOG_DIR, exist_ok=True)
+            handler = logging.handlers.RotatingFileHandler(os.path.join(LOG_DIR, LOG_FILE), maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+    return logger
+
+
+def row_count(value):
+    """Rows in a dataset, frame, array or row selection (None for anything else)."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    if isinstance(value, slice):
+        return None if value.stop is None else max(0, value.stop - (value.start or 0))
+    if isinstance(value, (Dataset, pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    if isinstance(value, Aggregates):
+        return len(value.cube)
+    return None
+
+
+def _figure(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    return value if isinstance(value, go.Figure) else None
+
+
+class SessionStats:
+    """Per-stage totals over every instrumented rerun of one session."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:8]
+        self.reruns = 0
+        self.total_ms = 0.0
+        self.stages = {}
+        # the rerun in progress (weakly), and whether an unfinished one was being profiled
+        self.running = None
+        self.profile_next = False
+
+    def add(self, stages, total_ms):
+        self.reruns += 1
+        self.total_ms += total_ms
+        for record in stages:
+            totals = self.stages.setdefault(record['stage'], {'calls': 0, 'total_ms': 0.0, 'max_ms': 0.0, 'alloc_kb': 0.0})
+            totals['calls'] += 1
+            totals['total_ms'] += record['ms']
+            totals['max_ms'] = max(totals['max_ms'], record['ms'])
+            totals['alloc_kb'] += record['alloc_kb']
+            if record['figure_bytes'] is not None:
+                totals['figure_bytes'] = record['figure_bytes']
+
+    def frame(self):
+        """One row per stage, slowest in total first."""
+        frame = pd.DataFrame([dict(stage=stage, **totals) for stage, totals in self.stages.items()],
+                             columns=['stage', 'calls', 'total_ms', 'max_ms', 'alloc_kb', 'figure_bytes'])
+        frame['mean_ms'] = frame['total_ms'] / frame['calls']
+        return frame.sort_values('total_ms', ascending=False, ignore_index=True)
+
+
+class Rerun:
+    """Stage records of one rerun, started at the top of the script and finished at the end."""
+
+    def __init__(self, session, profile=False, enabled=ENABLED):
+        self.session = session
+        self.enabled = enabled
+        self.stages = []
+        self.profile_path = None
+        self._profiler = None
+        self._started = time.perf_counter()
+        self._abandon = None
+        if not enabled:
+            return
+        previous = session.running() if session.running is not None else None
+        if previous is not None:
+            # the last rerun was interrupted (or raised) before finish()
+            previous.close()
+        session.running = weakref.ref(self)
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile or session.profile_next:
+            session.profile_next = False
+            self._profiler = cProfile.Profile()
+            try:
+                self._profiler.enable()
+            except ValueError:
+                # another session is being profiled right now
+                self._profiler = None
+            else:
+                self._abandon = weakref.finalize(self, _abandon_profile, self._profiler, session)
+
+    def measure(self, name, fn, *args, rows_in=None):
+        """Call fn(*args) as stage name and record it; returns fn's result."""
+        if not self.enabled:
+            return fn(*args)
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - start
+        current, peak = tracemalloc.get_traced_memory()
+        fig = _figure(result)
+        self.stages.append({
+            'stage': name,
+            'ms': elapsed * 1e3,
+            'rows_in': row_count(rows_in),
+            'rows_out': row_count(result),
+            'alloc_kb': (current - before) / 1024,
+            'peak_kb': (peak - before) / 1024,
+            'figure_bytes': figure_bytes(fig) if fig is not None else None,
+        })
+        return result
+
+    def finish(self):
+        """Close the rerun: stop profiling, add it to the session totals and log it."""
+        total_ms = (time.perf_counter() - self._started) * 1e3
+        self.session.running = None
+        if self._profiler is not None:
+            self._abandon.detach()
+            self._profiler.disable()
+            os.makedirs(LOG_DIR, exist_ok=True)
+            self.profile_path = os.path.join(LOG_DIR, f'profile-{self.session.id}-{self.session.reruns + 1}.prof')
+            self._profiler.dump_stats(self.profile_path)
+            self._profiler = None
+        self.session.add(self.stages, total_ms)
+        record = {
+            'time': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'session': self.session.id,
+            'rerun': self.session.reruns,
+            'total_ms': total_ms,
+            'stages': self.stages,
+            'profile': self.profile_path,
+        }
+        _log().info(json.dumps(record))
+        return record
+
+    def close(self):
+        """Stop profiling a rerun that will not be finished; the session's next rerun is profiled instead."""
+        if self._abandon is not None:
+            self._abandon()
+        self._profiler = None
+
+    def profile_bytes(self):
+        with open(self.profile_path, 'rb') as f:
+            return f.read()
+
+    def frame(self):
+        return pd.DataFrame(self.stages, columns=['stage', 'ms', 'rows_in', 'rows_out', 'alloc_kb', 'peak_kb', 'figure_bytes'])
+
+
+def _abandon_profile(profiler, session):
+    profiler.disable()
+    session.profile_next = True
+
+
+def profile_summary(path, limit=15):
+    """The top functions of a cProfile dump by cumulative time, as text."""
+    out = io.StringIO()
+    pstats.Stats(path, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,161 @@
+"""The stages of a dashboard rerun as plain functions.
+
+Loading, the date and Region/State/City filters, the aggregations and every
+figure build are functions of their inputs here (the CSV exports live in
+exports.py), so the dashboards and the benchmark harness run exactly the same
+code and a stage can be timed on its own. Nothing in this module touches
+Streamlit.
+"""
+
+import plotly.express as px
+import plotly.figure_factory as ff
+
+import pandas as pd
+
+from aggregations import KEY_DIMENSIONS, Aggregates, CodedColumns, aggregate
+from data_grid import page_frame
+from data_loader import append_dataset, load_dataset
+from date_index import DateIndex
+from filter_index import FilterIndex, LEVELS
+from scatter import DEFAULT_POINT_BUDGET, scatter_figure
+from time_buckets import GRANULARITIES, LABEL_COLUMNS, TimeBuckets
+
+SUMMARY_COLUMNS = ['Region', 'State', 'City', 'Category', 'Sales', 'Profit', 'Quantity']
+
+SCATTER_TITLE = 'Relationship Between sales and profits using scatter plot'
+
+
+# data
+
+def load(source=None, on_progress=None):
+    """The dataset for source; on_progress(StreamingAggregates, fraction) follows a streamed ingest."""
+    return load_dataset(source, on_progress)
+
+
+def append(dataset, source):
+    """dataset with the new rows of a delta file appended, its indexes and totals updated from the delta only."""
+    return append_dataset(dataset, source, extend=carry_over)
+
+
+def carry_over(base, appended, delta):
+    """Give appended the structures base has built, extended by the delta rows.
+
+    Each one costs about the size of the delta. Whatever cannot be extended
+    (a new Region/State/City or category label, dates that break the row
+    order, an order month before the first one, ...) is left to be rebuilt
+    on first use.
+    """
+    derived = base.derived
+    carried = {}
+    for granularity in GRANULARITIES:
+        buckets = derived.get(('time_buckets', granularity))
+        if buckets is not None:
+            carried[('time_buckets', granularity)] = buckets.extended(delta['Order Date'])
+    if 'date_index' in derived:
+        carried['date_index'] = derived['date_index'].extended(delta['Order Date'])
+    if 'filter_index' in derived:
+        carried['filter_index'] = derived['filter_index'].extended(delta)
+    months = carried.get(('time_buckets', 'Month'))
+    if 'coded_columns' in derived and months is not None:
+        carried['coded_columns'] = derived['coded_columns'].extended(delta, months)
+    coded = carried.get('coded_columns')
+    if 'totals' in derived and coded is not None:
+        # the delta's own cube added to the old totals, cell by cell
+        cube = pd.concat([derived['totals'].cube, aggregate(coded, slice(len(base), len(appended)), workers=1).cube])
+        cube = cube.groupby(list(KEY_DIMENSIONS), as_index=False, sort=True).sum()
+        carried['totals'] = Aggregates(coded, cube)
+    for name, value in carried.items():
+        if value is not None:
+            appended.derive(name, lambda d, value=value: value)
+
+
+def date_index(dataset):
+    """Binary-search index over the Order Dates, built once per dataset."""
+    return dataset.derive('date_index', lambda d: DateIndex(d.select(['Order Date'])['Order Date']))
+
+
+def date_window(dataset, start, end):
+    """Rows ordered between start and end, as a slice of the date-sorted rows."""
+    return date_index(dataset).window(start, end)
+
+
+def filter_index(dataset):
+    """Region/State/City row positions, built once per dataset."""
+    return dataset.derive('filter_index', lambda d: FilterIndex(d.select(LEVELS)))
+
+
+def location_rows(dataset, region=(), state=(), city=(), window=None):
+    """Rows of the window matching the Region/State/City selections."""
+    return filter_index(dataset).rows(region, state, city, window=window)
+
+
+def coded_columns(dataset):
+    return CodedColumns.for_dataset(dataset)
+
+
+def totals(dataset):
+    """The cube over every row, built once per dataset (and carried over on append)."""
+    return dataset.derive('totals', lambda d: aggregate(coded_columns(d)))
+
+
+def aggregate_rows(dataset, rows):
+    """One grouped pass over the selected rows; every chart is cut from the result."""
+    if isinstance(rows, slice) and rows.indices(len(dataset)) == (0, len(dataset), 1):
+        return totals(dataset)
+    return aggregate(coded_columns(dataset), rows)
+
+
+def time_series(dataset, aggregates, granularity):
+    return aggregates.time_series(TimeBuckets.for_dataset(dataset, granularity))
+
+
+# figures
+
+def category_bar(category_df):
+    return px.bar(category_df, x='Category', y='Sales', text=['${:,.2f}'.format(x) for x in category_df['Sales']], template='seaborn')
+
+
+def region_pie(region_df):
+    fig = px.pie(region_df, values='Sales', names='Region', hole=0.5)
+    fig.update_traces(text=region_df['Region'], textposition='outside')
+    return fig
+
+
+def time_series_line(linechart, granularity):
+    return px.line(linechart, x=LABEL_COLUMNS[granularity], y='Sales', labels={'Sales': 'Amount'}, height=500, width=1000, template='gridon')
+
+
+def treemap(hierarchy_df):
+    fig = px.treemap(hierarchy_df, path=['Region', 'Category', 'Sub-Category'], values='Sales', hover_data=['Sales'], color='Sub-Category')
+    fig.update_layout(width=800, height=650)
+    return fig
+
+
+def segment_pie(segment_df):
+    fig = px.pie(segment_df, values='Sales', names='Segment', template='plotly_dark')
+    fig.update_traces(text=segment_df['Segment'], textposition='inside')
+    return fig
+
+
+def category_pie(category_df):
+    fig = px.pie(category_df, values='Sales', names='Category', template='gridon')
+    fig.update_traces(text=category_df['Category'], textposition='inside')
+    return fig
+
+
+def summary_table(dataset, window):
+    """Table figure of the first five orders in the date window."""
+    # only these rows are converted from the snapshot
+    sample = page_frame(dataset, window, SUMMARY_COLUMNS, 0, 5)
+    return ff.create_table(sample, colorscale='Cividis')
+
+
+def scatter(dataset, rows, budget=DEFAULT_POINT_BUDGET, mode='bin', labels=None):
+    """(figure, represented, rendered) for the Sales/Profit scatter of the selected rows."""
+    measures = coded_columns(dataset).measures
+    fig, represented, rendered = scatter_figure(measures['Sales'][rows], measures['Profit'][rows], measures['Quantity'][rows], budget, mode, labels)
+    fig['layout'].update(title=dict(text=SCATTER_TITLE, font=dict(size=20)),
+                         xaxis=dict(title=dict(text='Sales', font=dict(size=19))),
+                         yaxis=dict(title=dict(text='Profit', font=dict(size=19))))
+    return fig, represented, rendered
+
@@ -0,0 +1,13 @@
+"""Row selections shared by the indexes, the aggregation engine and the data grid.
+
+A selection is either a slice (a contiguous window, e.g. a date range) or a
+sorted array of row positions; DateIndex and FilterIndex hand them out and
+everything downstream accepts both.
+"""
+
+
+def selection_size(rows, n_rows):
+    """Number of rows in a selection (slice or positions) of an n_rows dataset."""
+    if isinstance(rows, slice):
+        return len(range(*rows.indices(n_rows)))
+    return len(rows)
@@ -0,0 +1,103 @@
+"""What each session keeps on top of the shared datasets.
+
+data_loader holds one read-only copy of every distinct dataset (keyed by a
+digest of its content) for the whole process, so sessions looking at the
+bundled data or at identical uploads all use the same one. A SessionData is
+everything a session keeps of its own: a counted reference to the dataset it
+is looking at, the row positions of its current filters and the views built
+for them (view_cache.py).
+
+A session's reference is released when it moves to another dataset, when its
+session state is garbage collected, or after SESSION_IDLE_SECONDS without a
+rerun. Unreferenced datasets are evicted by data_loader once idle.
+"""
+
+import os
+import threading
+import time
+import uuid
+import weakref
+
+import pandas as pd
+
+from data_loader import acquire, cached_datasets, deep_nbytes, evict_idle, release
+from view_cache import ViewCache
+
+SESSION_IDLE_SECONDS = int(os.environ.get('SUPERSTORE_SESSION_IDLE_SECONDS', 30 * 60))
+
+_sessions = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+class SessionData:
+    """One session's reference to a shared dataset, its filter rows and its views."""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex[:8]
+        self.dataset = None
+        self.rows = None
+        self.views = ViewCache()
+        self.last_seen = time.monotonic()
+        self._release = None
+        with _lock:
+            _sessions.add(self)
+
+    def use(self, dataset):
+        """Point the session at dataset for this rerun and return it."""
+        sweep()
+        self.last_seen = time.monotonic()
+        if dataset is not self.dataset:
+            self.close()
+            acquire(dataset)
+            # also runs if the session state is dropped without close()
+            self._release = weakref.finalize(self, release, dataset)
+            self.dataset = dataset
+        return dataset
+
+    def close(self):
+        """Release the dataset and forget the rows and views built on it."""
+        if self._release is not None:
+            self._release()
+            self._release = None
+        self.dataset = None
+        self.rows = None
+        self.views = ViewCache()
+
+    def nbytes(self):
+        return deep_nbytes(self.rows) + deep_nbytes(self.views.values)
+
+
+def sweep():
+    """Release the datasets of sessions idle for SESSION_IDLE_SECONDS, then evict idle datasets."""
+    now = time.monotonic()
+    with _lock:
+        idle = [session for session in _sessions if session.dataset is not None and now - session.last_seen > SESSION_IDLE_SECONDS]
+    for session in idle:
+        session.close()
+    evict_idle()
+
+
+def dataset_report():
+    """One row per shared dataset: size of the snapshot and of the structures derived from it."""
+    now = time.monotonic()
+    return pd.DataFrame([{
+        'dataset': dataset.digest[:12],
+        'rows': len(dataset),
+        'snapshot_mb': dataset.nbytes / 1024 ** 2,
+        'derived_mb': dataset.derived_nbytes / 1024 ** 2,
+        'sessions': dataset.refs,
+        'idle_s': now - dataset.last_used if dataset.refs == 0 else 0.0,
+    } for dataset in cached_datasets()], columns=['dataset', 'rows', 'snapshot_mb', 'derived_mb', 'sessions', 'idle_s'])
+
+
+def session_report():
+    """One row per live session: its dataset and the memory of its own rows and views."""
+    now = time.monotonic()
+    with _lock:
+        sessions = list(_sessions)
+    return pd.DataFrame([{
+        'session': session.id,
+        'dataset': session.dataset.digest[:12] if session.dataset is not None else None,
+        'kb': session.nbytes() / 1024,
+        'idle_s': now - session.last_seen,
+    } for session in sessions], columns=['session', 'dataset', 'kb', 'idle_s'])
@@ -0,0 +1,184 @@
+"""Columnar on-disk snapshots of parsed datasets.
+
+A parsed dataset is written once as an uncompressed Arrow IPC (Feather v2)
+file named after its content digest. Later loads memory-map the file instead
+of re-parsing the CSV/XLSX: numeric columns are served straight from the
+mapping without a copy, and only the columns a view asks for are converted.
+
+Snapshots live in SNAPSHOT_DIR (SUPERSTORE_SNAPSHOT_DIR, by default
+.snapshots next to this module), one file per distinct upload. Every write
+prunes the directory: snapshots of an older SNAPSHOT_VERSION are removed,
+then the least recently used ones (by mtime, which opening a snapshot
+refreshes) until the directory is within SNAPSHOT_MAX_BYTES. The snapshot
+just written is always kept, and a file that cannot be removed (e.g. still
+mapped on Windows) is left for a later write.
+"""
+
+import os
+import re
+import uuid
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+
+# Bumped whenever the parsed layout changes, so stale snapshots are ignored.
+SNAPSHOT_VERSION = 2
+
+SNAPSHOT_DIR = os.environ.get(
+    'SUPERSTORE_SNAPSHOT_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.snapshots'),
+)
+
+# Upper bound on the size of SNAPSHOT_DIR, enforced whenever a snapshot is written.
+SNAPSHOT_MAX_BYTES = int(os.environ.get('SUPERSTORE_SNAPSHOT_MAX_BYTES', 4 * 1024 ** 3))
+
+_SNAPSHOT_NAME = re.compile(r'^[0-9a-f]+\.v(\d+)\.arrow$')
+
+
+def snapshot_path(digest):
+    return os.path.join(SNAPSHOT_DIR, f'{digest}.v{SNAPSHOT_VERSION}.arrow')
+
+
+def has_snapshot(digest):
+    return os.path.exists(snapshot_path(digest))
+
+
+def write_snapshot(frame, digest):
+    """Write frame as the snapshot for digest and return its path.
+
+    The file is written under a temporary name and renamed into place, so
+    concurrent sessions never map a half-written snapshot.
+    """
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(digest)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    # compression would force a decode (and a copy) on every read
+    feather.write_feather(frame, tmp_path, compression='uncompressed')
+    os.replace(tmp_path, path)
+    prune_snapshots(keep=path)
+    return path
+
+
+def write_snapshot_chunks(frames, digest):
+    """Write an iterable of frames as one snapshot for digest, a chunk at a time.
+
+    Every frame is converted to the schema of the first one and appended as
+    its own record batch, so only one chunk is held in memory. Returns the
+    path, or None when frames was empty.
+    """
+    def tables():
+        schema = None
+        for frame in frames:
+            table = pa.Table.from_pandas(frame, schema=schema, preserve_index=False)
+            schema = table.schema
+            yield table
+
+    return _write_tables(tables(), digest)
+
+
+def sort_snapshot(digest, column, batch_rows):
+    """Rewrite the snapshot for digest in column order, batch_rows rows at a time, and return its path.
+
+    The sort is stable with missing values last, like parse_superstore's. A
+    snapshot already in order is left as it is.
+    """
+    table = open_snapshot(digest)
+    # nulls are placed at the end by default
+    order = pc.sort_indices(table[column])
+    if np.array_equal(order.to_numpy(), np.arange(len(table))):
+        return snapshot_path(digest)
+    return _write_tables((table.take(order[start:start + batch_rows]) for start in range(0, len(table), batch_rows)), digest)
+
+
+def _write_tables(tables, digest):
+    """Write an iterable of tables of one schema as the snapshot for digest; returns its path or None."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = snapshot_path(digest)
+    tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+    writer = None
+    try:
+        for table in tables:
+            if writer is None:
+                # the same uncompressed IPC file layout write_snapshot produces
+                writer = pa.ipc.new_file(tmp_path, table.schema)
+            writer.write_table(table)
+        if writer is None:
+            return None
+        writer.close()
+        writer = None
+        os.replace(tmp_path, path)
+        prune_snapshots(keep=path)
+        return path
+    except BaseException:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def open_snapshot(digest):
+    """Memory-map the snapshot for digest and return it as a pyarrow Table.
+
+    No column data is read until it is converted or accessed.
+    """
+    path = snapshot_path(digest)
+    table = feather.read_table(path, memory_map=True)
+    try:
+        # mark it as recently used for prune_snapshots()
+        os.utime(path)
+    except OSError:
+        pass
+    return table
+
+
+def prune_snapshots(keep=None, max_bytes=None):
+    """Remove stale and least recently used snapshots until SNAPSHOT_DIR fits max_bytes.
+
+    keep is a path that is never removed. Returns the paths removed.
+    """
+    max_bytes = SNAPSHOT_MAX_BYTES if max_bytes is None else max_bytes
+    snapshots = []
+    try:
+        entries = list(os.scandir(SNAPSHOT_DIR))
+    except OSError:
+        return []
+    for entry in entries:
+        match = _SNAPSHOT_NAME.match(entry.name)
+        if match is None:
+            # temporary files of writes in progress, and anything else
+            continue
+        try:
+            stat = entry.stat()
+        except OSError:
+            continue
+        stale = int(match.group(1)) != SNAPSHOT_VERSION
+        snapshots.append((not stale, stat.st_mtime, stat.st_size, entry.path))
+
+    removed = []
+    total = sum(size for _, _, size, _ in snapshots)
+    # stale versions first, then the least recently used
+    for current, _, size, path in sorted(snapshots):
+        if current and total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed.append(path)
+    return removed
+
+
+def table_to_frame(table, columns=None):
+    """Convert the requested columns of a snapshot table to a DataFrame."""
+    if columns is not None:
+        table = table.select(list(columns))
+    # split_blocks keeps each column in its own block, which lets numeric
+    # columns stay zero-copy views of the mapped file
+    return table.to_pandas(split_blocks=True)
+
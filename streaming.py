@@ -0,0 +1,119 @@
+"""Running aggregates and filter dimensions folded from chunks of an upload.
+
+Large uploads are ingested chunk by chunk (see data_loader.iter_chunks), so
+there is never a full frame to aggregate. StreamingAggregates folds each
+chunk into the same cube the aggregation engine builds (sums and counts per
+Region x Segment x Category x Sub-Category x order month) and into the
+Region -> State -> City option lists. Both are small, so the dashboard can
+show partial charts while the rest of the file is still being read.
+
+Labels get codes in first-seen order while streaming; aggregates() renumbers
+them in sorted order, which is the order categorical codes use elsewhere.
+"""
+
+import numpy as np
+import pandas as pd
+
+from aggregations import DIMENSIONS, MEASURES, MONTH, Aggregates
+from filter_index import LEVELS
+from time_buckets import TimeBuckets, bucket_numbers
+
+KEYS = list(DIMENSIONS) + [MONTH]
+
+
+class _StreamedColumns:
+    """The parts of CodedColumns that Aggregates needs to label a cube."""
+
+    def __init__(self, labels, months):
+        self.labels = dict(labels)
+        self.labels[MONTH] = list(range(months.n))
+        self.months = months
+        self.measures = {}
+
+
+class StreamingAggregates:
+
+    def __init__(self):
+        self.rows = 0
+        self.chunks = 0
+        self._labels = {}
+        self._lookup = {}
+        # (parent code, child code) pairs seen for Region -> State and State -> City
+        self._pairs = {child: set() for child in LEVELS[1:]}
+        self._cube = None
+
+    def _encode(self, name, column):
+        """Codes of column's values in the running vocabulary of name (-1 for missing)."""
+        labels = self._labels.setdefault(name, [])
+        lookup = self._lookup.setdefault(name, {})
+        codes, uniques = pd.factorize(column)
+        # one slot per unique plus a trailing -1, which the missing values' code (-1) picks
+        mapping = np.full(len(uniques) + 1, -1, dtype=np.int64)
+        for i, label in enumerate(uniques):
+            code = lookup.get(label)
+            if code is None:
+                code = lookup[label] = len(labels)
+                labels.append(label)
+            mapping[i] = code
+        return mapping[codes]
+
+    def add(self, frame):
+        """Fold one parsed chunk into the cube and the filter dimensions."""
+        codes = {name: self._encode(name, frame[name]) for name in dict.fromkeys(DIMENSIONS + LEVELS)}
+
+        part = {dimension: codes[dimension] for dimension in DIMENSIONS}
+        part[MONTH] = bucket_numbers(frame['Order Date'], 'Month')
+        for measure in MEASURES:
+            part[measure] = frame[measure].to_numpy(dtype=np.float64, na_value=np.nan)
+        part['Count'] = np.ones(len(frame), dtype=np.int64)
+        part = pd.DataFrame(part).groupby(KEYS, as_index=False, sort=False).sum()
+        if self._cube is not None:
+            part = pd.concat([self._cube, part], ignore_index=True).groupby(KEYS, as_index=False, sort=False).sum()
+        self._cube = part
+
+        for parent, child in zip(LEVELS, LEVELS[1:]):
+            pairs = np.unique(np.stack([codes[parent], codes[child]]), axis=1)
+            self._pairs[child].update(zip(pairs[0].tolist(), pairs[1].tolist()))
+
+        self.rows += len(frame)
+        self.chunks += 1
+
+    def options(self, level, region=(), state=()):
+        """Sorted labels of level seen so far, narrowed like the sidebar cascade."""
+        labels = self._labels.get(level, [])
+        allowed = set(range(len(labels)))
+        selected = {'Region': region, 'State': state}
+        for parent in LEVELS[:LEVELS.index(level)]:
+            if not selected[parent]:
+                continue
+            codes = {self._lookup[parent][label] for label in selected[parent] if label in self._lookup[parent]}
+            # walk the selection down to level
+            for child in LEVELS[LEVELS.index(parent) + 1:LEVELS.index(level) + 1]:
+                codes = {c for p, c in self._pairs[child] if p in codes}
+            allowed &= codes
+        return sorted(labels[code] for code in allowed)
+
+    def aggregates(self):
+        """Aggregates over every row folded so far (None before the first chunk)."""
+        if self._cube is None:
+            return None
+        cube = self._cube.copy()
+        labels = {}
+        for dimension in DIMENSIONS:
+            seen = self._labels[dimension]
+            order = sorted(range(len(seen)), key=seen.__getitem__)
+            rank = np.empty(len(seen) + 1, dtype=np.int64)
+            rank[order] = np.arange(len(seen))
+            # missing values take the trailing code, as in CodedColumns
+            rank[len(seen)] = len(seen)
+            codes = cube[dimension].to_numpy()
+            cube[dimension] = rank[np.where(codes < 0, len(seen), codes)]
+            labels[dimension] = [seen[i] for i in order]
+
+        months = cube[MONTH].to_numpy()
+        valid = months >= 0
+        first = int(months[valid].min()) if valid.any() else 0
+        n = int(months[valid].max()) - first + 1 if valid.any() else 0
+        cube[MONTH] = np.where(valid, months - first, n)
+        cube = cube.groupby(KEYS, as_index=False, sort=True).sum()
+        return Aggregates(_StreamedColumns(labels, TimeBuckets.span('Month', first, n)), cube)
@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregations import CodedColumns, aggregate
+from data_loader import DEFAULT_DATA_PATH, parse_superstore
+from time_buckets import TimeBuckets
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return parse_superstore(DEFAULT_DATA_PATH)
+
+
+@pytest.fixture(scope='module')
+def coded(frame):
+    return CodedColumns(frame)
+
+
+def selections(frame):
+    return {
+        'all': slice(None),
+        'window': slice(2000, 7000),
+        'positions': np.flatnonzero((frame['Region'] == 'West').to_numpy() | (frame['Segment'] == 'Home Office').to_numpy()),
+    }
+
+
+def filtered(frame, rows):
+    """The selected rows as the original script had them, with plain object labels."""
+    df = frame.iloc[rows].copy()
+    for column in ['Region', 'Segment', 'Category', 'Sub-Category']:
+        df[column] = df[column].astype(object)
+    return df
+
+
+@pytest.fixture(params=['all', 'window', 'positions'])
+def case(request, frame, coded):
+    rows = selections(frame)[request.param]
+    return aggregate(coded, rows, workers=1), filtered(frame, rows)
+
+
+@pytest.mark.parametrize('method,dimension', [
+    ('category_sales', 'Category'),
+    ('region_sales', 'Region'),
+    ('segment_sales', 'Segment'),
+])
+def test_sales_by_dimension(case, method, dimension):
+    aggregates, filtered_df = case
+    expected = filtered_df.groupby(by=[dimension], as_index=False)['Sales'].sum()
+    pd.testing.assert_frame_equal(getattr(aggregates, method)(), expected, check_dtype=False)
+
+
+def test_hierarchy_sales(case):
+    aggregates, filtered_df = case
+    expected = filtered_df.groupby(['Region', 'Category', 'Sub-Category'], as_index=False)['Sales'].sum()
+    pd.testing.assert_frame_equal(aggregates.hierarchy_sales(), expected, check_dtype=False)
+
+
+def test_monthly_sales(case):
+    aggregates, filtered_df = case
+    filtered_df['month_year'] = filtered_df['Order Date'].dt.to_period('M')
+    expected = pd.DataFrame(filtered_df.groupby(filtered_df['month_year'].dt.strftime('%Y : %b'))['Sales'].sum()).reset_index()
+    # the original grouped on the label text; the cube keeps calendar order
+    actual = aggregates.monthly_sales()
+    assert list(actual['month_year']) == list(pd.PeriodIndex(filtered_df['month_year'].sort_values().unique()).strftime('%Y : %b'))
+    pd.testing.assert_frame_equal(actual.sort_values('month_year', ignore_index=True), expected, check_dtype=False)
+
+
+def test_subcategory_month_sales(case):
+    aggregates, filtered_df = case
+    filtered_df['Month'] = filtered_df['Order Date'].dt.month_name()
+    expected = pd.pivot_table(data=filtered_df, values='Sales', index=['Sub-Category'], columns='Month')
+    actual = aggregates.subcategory_month_sales()
+    pd.testing.assert_frame_equal(actual[expected.columns], expected, check_names=False)
+
+
+@pytest.mark.parametrize('granularity,period', [('Day', 'D'), ('Week', 'W-SUN'), ('Quarter', 'Q')])
+def test_time_series(case, coded, frame, granularity, period):
+    aggregates, filtered_df = case
+    buckets = TimeBuckets(frame['Order Date'], granularity)
+    actual = aggregates.time_series(buckets)
+    expected = filtered_df.groupby(filtered_df['Order Date'].dt.to_period(period))['Sales'].sum()
+    assert np.allclose(actual['Sales'], expected.to_numpy())
+    assert len(actual) == len(expected)
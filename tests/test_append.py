@@ -0,0 +1,152 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pipeline
+import snapshot
+from aggregations import Aggregates
+from data_loader import DATE_FORMAT, DEFAULT_DATA_PATH, Dataset, clear_cache
+from incremental import SortedRuns
+from time_buckets import GRANULARITIES, TimeBuckets
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    clear_cache()
+    yield
+    clear_cache()
+
+
+@pytest.fixture(scope='module')
+def raw():
+    """The bundled sample as text, ordered by Order Date."""
+    frame = pd.read_csv(DEFAULT_DATA_PATH, dtype=str, encoding='utf-8-sig')
+    dates = pd.to_datetime(frame['Order Date'], format=DATE_FORMAT)
+    return frame.iloc[np.argsort(dates.to_numpy(), kind='stable')].reset_index(drop=True)
+
+
+def written(tmp_path, name, frame):
+    path = tmp_path / name
+    frame.to_csv(path, index=False)
+    return str(path)
+
+
+def build_all(dataset):
+    """Every structure the dashboards derive from a dataset."""
+    pipeline.date_index(dataset)
+    pipeline.filter_index(dataset)
+    for granularity in GRANULARITIES:
+        TimeBuckets.for_dataset(dataset, granularity)
+    pipeline.totals(dataset)
+
+
+def assert_same(carried, fresh, path='structure'):
+    if isinstance(fresh, Aggregates):
+        assert_same(carried.coded, fresh.coded, f'{path}.coded')
+        pd.testing.assert_frame_equal(carried.cube.reset_index(drop=True), fresh.cube.reset_index(drop=True), check_dtype=False, obj=path)
+    elif isinstance(fresh, np.ndarray):
+        assert np.array_equal(carried, fresh), path
+    elif isinstance(fresh, pd.DataFrame):
+        pd.testing.assert_frame_equal(carried, fresh, obj=path)
+    elif isinstance(fresh, dict):
+        assert carried.keys() == fresh.keys(), path
+        for key in fresh:
+            assert_same(carried[key], fresh[key], f'{path}[{key!r}]')
+    elif isinstance(fresh, (list, tuple)):
+        assert len(carried) == len(fresh), path
+        for i, (a, b) in enumerate(zip(carried, fresh)):
+            assert_same(a, b, f'{path}[{i}]')
+    elif hasattr(fresh, '__dict__'):
+        assert type(carried) is type(fresh), path
+        assert_same(vars(carried), vars(fresh), path)
+    else:
+        assert carried == fresh, path
+
+
+def check_appended(appended, combined_path):
+    """Every structure of appended equals a fresh build, and its totals those of the combined file."""
+    build_all(appended)
+    fresh = Dataset('fresh', appended.table)
+    build_all(fresh)
+    for name, value in fresh.derived.items():
+        assert_same(appended.derived[name], value, repr(name))
+
+    keys = appended.derived[('row_keys', 'Row ID')]
+    row_ids = appended.select(['Row ID'])['Row ID'].to_numpy()
+    assert keys.contains(row_ids).all()
+    assert not keys.contains(np.array([0, row_ids.max() + 1])).any()
+
+    combined = pipeline.load(combined_path)
+    assert len(combined) == len(appended)
+    totals, expected = pipeline.totals(appended), pipeline.totals(combined)
+    for dimensions in (['Region'], ['Category', 'Sub-Category'], ['Segment']):
+        pd.testing.assert_frame_equal(totals.by(dimensions, ('Sales', 'Profit', 'Quantity')), expected.by(dimensions, ('Sales', 'Profit', 'Quantity')))
+    pd.testing.assert_frame_equal(totals.monthly_sales(), expected.monthly_sales())
+    pd.testing.assert_frame_equal(totals.subcategory_month_sales(), expected.subcategory_month_sales())
+
+
+def known(base, rows):
+    """rows whose Region/State/City combination base already has."""
+    places = ['Region', 'State', 'City']
+    seen = pd.MultiIndex.from_frame(base[places])
+    return rows[pd.MultiIndex.from_frame(rows[places]).isin(seen)]
+
+
+def appended_to(base_path, delta_path):
+    base = pipeline.load(base_path)
+    build_all(base)
+    return base, pipeline.append(base, delta_path)
+
+
+def test_later_orders_carry_every_structure(raw, tmp_path):
+    base = raw.iloc[:8000]
+    delta = known(base, raw.iloc[8000:])
+    _, appended = appended_to(written(tmp_path, 'base.csv', base), written(tmp_path, 'delta.csv', delta))
+
+    assert {'date_index', 'filter_index', 'coded_columns', 'totals', ('row_keys', 'Row ID')} <= set(appended.derived)
+    check_appended(appended, written(tmp_path, 'combined.csv', pd.concat([base, delta])))
+
+
+def test_duplicate_row_ids_are_skipped(raw, tmp_path):
+    base, delta = raw.iloc[:8000], raw.iloc[8000:]
+    # rows already in the base, and rows repeated within the delta
+    delta = pd.concat([raw.iloc[7990:8000], delta, delta.iloc[:25]])
+    _, appended = appended_to(written(tmp_path, 'base.csv', base), written(tmp_path, 'delta.csv', delta))
+
+    assert len(appended) == len(raw)
+    check_appended(appended, written(tmp_path, 'combined.csv', raw))
+
+
+def test_new_labels_are_rebuilt(raw, tmp_path):
+    base, delta = raw.iloc[:8000], raw.iloc[8000:].copy()
+    delta.iloc[:3, delta.columns.get_loc('City')] = 'Springfield North'
+    delta.iloc[3:5, delta.columns.get_loc('Region')] = 'North'
+    delta.iloc[5:6, delta.columns.get_loc('Sub-Category')] = 'Drones'
+    _, appended = appended_to(written(tmp_path, 'base.csv', base), written(tmp_path, 'delta.csv', delta))
+
+    assert 'filter_index' not in appended.derived and 'coded_columns' not in appended.derived
+    check_appended(appended, written(tmp_path, 'combined.csv', pd.concat([base, delta])))
+
+
+def test_earlier_dates_are_rebuilt(raw, tmp_path):
+    base, delta = raw.iloc[2000:], raw.iloc[:2000]
+    _, appended = appended_to(written(tmp_path, 'base.csv', base), written(tmp_path, 'delta.csv', delta))
+
+    assert 'date_index' not in appended.derived
+    check_appended(appended, written(tmp_path, 'combined.csv', raw))
+
+
+def test_two_deltas_on_the_same_base(raw, tmp_path):
+    base_path = written(tmp_path, 'base.csv', raw.iloc[:8000])
+    first_delta, second_delta = raw.iloc[8000:9000], raw.iloc[8500:]
+    base, first = appended_to(base_path, written(tmp_path, 'first.csv', first_delta))
+    # the second delta extends the same base, whose buffers the first one has grown
+    second = pipeline.append(base, written(tmp_path, 'second.csv', second_delta))
+
+    check_appended(first, written(tmp_path, 'first_combined.csv', raw.iloc[:9000]))
+    check_appended(second, written(tmp_path, 'second_combined.csv', pd.concat([raw.iloc[:8000], second_delta])))
+    # and folding a delta onto an appended dataset
+    third = pipeline.append(first, written(tmp_path, 'third.csv', raw.iloc[9000:]))
+    check_appended(third, written(tmp_path, 'third_combined.csv', raw))
+    check_appended(base, base_path)
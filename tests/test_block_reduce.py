@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+import block_reduce
+from aggregations import CodedColumns, aggregate
+from data_loader import DEFAULT_DATA_PATH, parse_superstore
+
+
+def identical(a, b):
+    """Same cells with bit-for-bit equal values."""
+    return a.columns.equals(b.columns) and all(
+        np.array_equal(a[column].to_numpy().view(np.uint8), b[column].to_numpy().view(np.uint8)) for column in a.columns)
+
+
+@pytest.fixture(scope='module')
+def coded():
+    return CodedColumns(parse_superstore(DEFAULT_DATA_PATH))
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    monkeypatch.setattr(block_reduce, 'BLOCK_ROWS', 700)
+    yield
+    block_reduce._discard_pool()
+
+
+@pytest.mark.parametrize('selection', ['all', 'slice', 'strided', 'positions'])
+def test_parallel_matches_serial_bit_for_bit(coded, small_blocks, selection):
+    n_rows = len(coded.keys)
+    rows = {
+        'all': slice(None),
+        'slice': slice(123, n_rows - 456),
+        'strided': slice(5, None, 3),
+        'positions': np.sort(np.random.default_rng(0).choice(n_rows, n_rows // 2, replace=False)),
+    }[selection]
+
+    serial = aggregate(coded, rows, workers=1).cube
+    parallel = aggregate(coded, rows, workers=2).cube
+
+    assert block_reduce._pool is not None, 'the selection was not reduced in the pool'
+    assert identical(serial, parallel)
+
+
+@pytest.mark.parametrize('dense', [True, False])
+def test_blocks_merge_to_the_unblocked_reduction(coded, small_blocks, dense):
+    measures = [coded.measures[measure] for measure in ('Sales', 'Profit')]
+    cells = int(coded.keys.max()) + 1 if dense else None
+    present, counts, sums = block_reduce.reduce_rows(coded.keys, measures, slice(None), cells, dense, workers=1)
+
+    expected_present, inverse = np.unique(coded.keys, return_inverse=True)
+    assert np.array_equal(present, expected_present)
+    assert np.array_equal(counts, np.bincount(inverse))
+    for total, values in zip(sums, measures):
+        assert np.allclose(total, np.bincount(inverse, weights=values))
@@ -0,0 +1,103 @@
+import pandas as pd
+import pytest
+
+import data_loader
+import pipeline
+import snapshot
+from data_loader import DEFAULT_DATA_PATH, acquire, cache_stats, clear_cache, load_dataset, parse_dates, release
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path / 'snapshots'))
+    clear_cache()
+    yield
+    clear_cache()
+
+
+def sample(path, rows):
+    """Write the header and the first rows of the bundled sample to path."""
+    with open(DEFAULT_DATA_PATH, 'rb') as source:
+        lines = source.read().splitlines(keepends=True)
+    path.write_bytes(b''.join(lines[:rows + 1]))
+    return str(path)
+
+
+def test_parse_dates_falls_back_to_other_layouts():
+    values = pd.Series(['16-06-2016', '11/08/2016', None, 'n/a'], dtype='string')
+    expected = pd.to_datetime(pd.Series(['2016-06-16', '2016-11-08', None, None]))
+    assert parse_dates(values).equals(expected.astype(parse_dates(values).dtype))
+    month_first = parse_dates(pd.Series(['11/08/2016', '12/31/2016'], dtype='string'))
+    assert list(month_first) == [pd.Timestamp('2016-11-08'), pd.Timestamp('2016-12-31')]
+
+
+def test_insert_keeps_new_dataset_when_referenced_datasets_fill_budget(cache, tmp_path, monkeypatch):
+    held = load_dataset(sample(tmp_path / 'a.csv', 50))
+    acquire(held)
+    # the referenced dataset alone is over budget
+    monkeypatch.setattr(data_loader, 'MAX_CACHE_BYTES', 1)
+
+    path = sample(tmp_path / 'b.csv', 80)
+    loads = [load_dataset(path) for _ in range(3)]
+
+    assert loads[0] is loads[1] is loads[2]
+    stats = cache_stats()
+    assert stats['misses'] == 2 and stats['hits'] == 2 and stats['evictions'] == 0
+    release(held)
+
+
+def test_release_evicts_unreferenced_datasets_over_budget(cache, tmp_path, monkeypatch):
+    held = load_dataset(sample(tmp_path / 'a.csv', 50))
+    acquire(held)
+    monkeypatch.setattr(data_loader, 'MAX_CACHE_BYTES', 1)
+    other = load_dataset(sample(tmp_path / 'b.csv', 80))
+    acquire(other)
+
+    release(held)
+
+    assert data_loader.cached_datasets() == [other]
+    release(other)
+
+
+def test_streamed_snapshot_is_in_order_date_order(cache, tmp_path, monkeypatch):
+    monkeypatch.setattr(data_loader, 'STREAMING_BYTES', 0)
+    monkeypatch.setattr(data_loader, 'CHUNK_ROWS', 700)
+    path = sample(tmp_path / 'large.csv', 3000)
+
+    streamed = load_dataset(path)
+
+    assert streamed.table.num_rows == 3000 and streamed.table.to_batches()[0].num_rows <= 700
+    parsed = data_loader.parse_superstore(path, path)
+    frame = streamed.frame
+    for column in data_loader.CATEGORICAL_COLUMNS:
+        frame[column] = frame[column].astype('category')
+    pd.testing.assert_frame_equal(frame, parsed, check_dtype=False, check_categorical=False)
+    assert isinstance(pipeline.date_window(streamed, parsed['Order Date'].min(), parsed['Order Date'].max()), slice)
+
+
+def test_derived_structures_are_charged_to_the_cache(cache, tmp_path):
+    dataset = load_dataset(sample(tmp_path / 'a.csv', 500))
+    assert cache_stats()['bytes'] == dataset.nbytes
+
+    pipeline.filter_index(dataset)
+    pipeline.totals(dataset)
+    dataset.select(['Sales', 'Profit'])
+
+    assert set(dataset.derived) == {'filter_index', ('time_buckets', 'Month'), 'coded_columns', 'totals'}
+    assert dataset.derived_nbytes > 0
+    assert cache_stats()['bytes'] == dataset.nbytes + dataset.derived_nbytes
+
+    clear_cache()
+    assert cache_stats()['bytes'] == 0
+
+
+@pytest.mark.parametrize('window', [slice(100, 300), slice(498, 600), [3, 50, 51, 52, 60, 61, 400]])
+def test_summary_table_shows_the_first_rows_of_the_window(cache, tmp_path, monkeypatch, window):
+    dataset = load_dataset(sample(tmp_path / 'a.csv', 500))
+    tables = []
+    monkeypatch.setattr(pipeline.ff, 'create_table', lambda frame, **kwargs: tables.append(frame))
+
+    pipeline.summary_table(dataset, window)
+
+    expected = dataset.frame[pipeline.SUMMARY_COLUMNS].iloc[window][0:5]
+    pd.testing.assert_frame_equal(tables[0].reset_index(drop=True), expected.reset_index(drop=True))
@@ -0,0 +1,107 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from data_loader import DEFAULT_DATA_PATH, parse_superstore
+from filter_index import LEVELS, FilterIndex
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return parse_superstore(DEFAULT_DATA_PATH)
+
+
+@pytest.fixture(scope='module')
+def index(frame):
+    return FilterIndex(frame[list(LEVELS)])
+
+
+def windows(n_rows):
+    rng = np.random.default_rng(0)
+    return {
+        'all': None,
+        'slice': slice(n_rows // 5, 3 * n_rows // 4),
+        'positions': np.sort(rng.choice(n_rows, n_rows // 3, replace=False)),
+    }
+
+
+def window_frame(frame, window):
+    """The rows of window with their positions, as the original script filtered by date."""
+    positions = np.arange(len(frame))
+    if window is not None:
+        positions = positions[window]
+    return frame.iloc[positions], positions
+
+
+def original_options(df, region, state):
+    """The region, state and city options of the original unique() cascade."""
+    df2 = df.copy() if not region else df[df['Region'].isin(region)]
+    df3 = df2.copy() if not state else df2[df2['State'].isin(state)]
+    return df['Region'].unique(), df2['State'].unique(), df3['City'].unique()
+
+
+def original_rows(df, region, state, city):
+    """The mask of the original eight-branch isin chain."""
+    if not region and not state and not city:
+        mask = np.ones(len(df), dtype=bool)
+    elif not state and not city:
+        mask = df["Region"].isin(region)
+    elif not region and not city:
+        mask = df["State"].isin(state)
+    elif state and city:
+        mask = (df["State"].isin(state)) & (df["City"].isin(city))
+    elif region and city:
+        mask = (df["Region"].isin(region)) & (df["City"].isin(city))
+    elif region and state:
+        mask = (df["Region"].isin(region)) & (df["State"].isin(state))
+    elif city:
+        mask = df["City"].isin(city)
+    else:
+        mask = (df["Region"].isin(region)) & (df["State"].isin(state)) & (df["City"].isin(city))
+    return np.asarray(mask, dtype=bool)
+
+
+def positions_of(rows, n_rows):
+    return np.arange(n_rows)[rows]
+
+
+def check(frame, index, region, state, city, window):
+    df, positions = window_frame(frame, window)
+    regions, states, cities = original_options(df, region, state)
+    assert index.options('Region', window=window) == sorted(regions)
+    assert index.options('State', region, window=window) == sorted(states)
+    assert index.options('City', region, state, window=window) == sorted(cities)
+
+    expected = positions[original_rows(df, region, state, city)]
+    assert np.array_equal(positions_of(index.rows(region, state, city, window=window), len(frame)), expected)
+
+
+def pick(options, count, rng=None):
+    if rng is None:
+        return list(options[:count])
+    return list(rng.choice(options, min(count, len(options)), replace=False)) if options else []
+
+
+@pytest.mark.parametrize('window_kind', ['all', 'slice', 'positions'])
+@pytest.mark.parametrize('use_region,use_state,use_city', list(itertools.product([False, True], repeat=3)))
+def test_matches_original_filters(frame, index, window_kind, use_region, use_state, use_city):
+    window = windows(len(frame))[window_kind]
+    # selections come from the options offered, as in the sidebar
+    region = pick(index.options('Region', window=window), 2) if use_region else []
+    state = pick(index.options('State', region, window=window), 3) if use_state else []
+    city = pick(index.options('City', region, state, window=window), 4) if use_city else []
+    assert (bool(region), bool(state), bool(city)) == (use_region, use_state, use_city)
+    check(frame, index, region, state, city, window)
+
+
+def test_matches_original_filters_on_random_selections(frame, index):
+    rng = np.random.default_rng(1)
+    n_rows = len(frame)
+    for _ in range(50):
+        start, stop = np.sort(rng.integers(0, n_rows, 2))
+        window = [None, slice(int(start), int(stop)), np.sort(rng.choice(n_rows, int(rng.integers(0, n_rows)), replace=False))][rng.integers(0, 3)]
+        region = pick(index.options('Region', window=window), rng.integers(0, 3), rng)
+        state = pick(index.options('State', region, window=window), rng.integers(0, 4), rng)
+        city = pick(index.options('City', region, state, window=window), rng.integers(0, 6), rng)
+        check(frame, index, region, state, city, window)
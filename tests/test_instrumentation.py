@@ -0,0 +1,46 @@
+import gc
+import sys
+
+import pytest
+
+import instrumentation
+from instrumentation import Rerun, SessionStats
+
+
+@pytest.fixture(autouse=True)
+def log_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(instrumentation, 'LOG_DIR', str(tmp_path))
+
+
+def test_interrupted_profiled_rerun_is_stopped_and_profiles_the_next():
+    session = SessionStats()
+    interrupted = Rerun(session, profile=True, enabled=True)
+    assert sys.getprofile() is not None
+
+    rerun = Rerun(session, enabled=True)
+    assert interrupted._profiler is None
+    record = rerun.finish()
+
+    assert sys.getprofile() is None
+    assert record['profile'] is not None and session.reruns == 1
+    assert not session.profile_next
+
+
+def test_collected_profiled_rerun_stops_its_profiler():
+    session = SessionStats()
+    rerun = Rerun(session, profile=True, enabled=True)
+    del rerun
+    gc.collect()
+
+    assert sys.getprofile() is None
+    assert session.profile_next
+
+
+def test_finished_rerun_leaves_nothing_pending():
+    session = SessionStats()
+    rerun = Rerun(session, profile=True, enabled=True)
+    rerun.finish()
+    del rerun
+    gc.collect()
+
+    assert session.running is None and not session.profile_next
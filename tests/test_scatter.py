@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from scatter import scatter_figure, stratified_sample
+
+
+def orders(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.lognormal(4, 1, n), rng.normal(20, 50, n), rng.integers(1, 10, n).astype(np.float64)
+
+
+@pytest.mark.parametrize('mode', ['bin', 'sample'])
+def test_non_finite_orders_are_left_out(mode):
+    sales, profit, quantity = orders(10_000)
+    profit[7] = np.nan
+    sales[11] = np.inf
+
+    fig, represented, rendered = scatter_figure(sales, profit, quantity, budget=1000, mode=mode)
+
+    assert represented == 9_998
+    assert 0 < rendered <= (100 * 100 if mode == 'bin' else 1000)
+    if mode == 'bin':
+        assert np.isfinite(fig.data[0].x).all() and np.isfinite(fig.data[0].y).all()
+
+
+def test_stratified_sample_keeps_outliers_within_budget():
+    sales, profit, _ = orders(10_000)
+    profit[123] = 1e6
+
+    keep = stratified_sample(sales, profit, 500)
+
+    assert len(keep) <= 500 and 123 in keep
+    assert np.array_equal(keep, np.unique(keep))
@@ -0,0 +1,48 @@
+import os
+
+import pandas as pd
+import pytest
+
+import snapshot
+from snapshot import open_snapshot, prune_snapshots, snapshot_path, write_snapshot
+
+
+@pytest.fixture(autouse=True)
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_DIR', str(tmp_path))
+    return tmp_path
+
+
+def written(digest, mtime):
+    path = write_snapshot(pd.DataFrame({'Sales': range(1000)}), digest)
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_write_prunes_least_recently_used_over_budget(monkeypatch):
+    paths = [written(digest, mtime) for digest, mtime in [('aa', 100), ('bb', 200), ('cc', 300)]]
+    size = os.path.getsize(paths[0])
+    monkeypatch.setattr(snapshot, 'SNAPSHOT_MAX_BYTES', 2 * size)
+
+    # opening bb makes it the most recently used of the three
+    open_snapshot('bb')
+    path = write_snapshot(pd.DataFrame({'Sales': range(1000)}), 'dd')
+
+    assert sorted(os.listdir(snapshot.SNAPSHOT_DIR)) == sorted(os.path.basename(p) for p in (paths[1], path))
+
+
+def test_prune_keeps_the_snapshot_just_written():
+    path = written('aa', 100)
+    assert prune_snapshots(keep=path, max_bytes=0) == []
+    assert os.path.exists(path)
+
+
+def test_prune_removes_stale_versions_first(snapshot_dir):
+    current = written('aa', 100)
+    stale = snapshot_dir / f'bb.v{snapshot.SNAPSHOT_VERSION - 1}.arrow'
+    stale.write_bytes(b'old')
+    temporary = snapshot_dir / f'{os.path.basename(snapshot_path("cc"))}.0123.tmp'
+    temporary.write_bytes(b'in progress')
+
+    assert prune_snapshots() == [str(stale)]
+    assert os.path.exists(current) and temporary.exists()
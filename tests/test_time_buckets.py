@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from time_buckets import TimeBuckets, bucket_labels, bucket_numbers
+
+
+@pytest.fixture(scope='module')
+def dates():
+    # every day across year ends, a leap day and dates before the 1970 epoch
+    return pd.Series(pd.date_range('1968-12-20', '1970-01-20').append(pd.date_range('2015-12-20', '2017-01-10')))
+
+
+@pytest.mark.parametrize('granularity,period', [('Day', 'D'), ('Week', 'W-SUN'), ('Month', 'M'), ('Quarter', 'Q')])
+def test_buckets_follow_pandas_periods(dates, granularity, period):
+    numbers = bucket_numbers(dates, granularity)
+    periods = dates.dt.to_period(period)
+    # same bucket exactly when the period is the same, and buckets increase with the period
+    assert np.array_equal(np.diff(numbers) == 0, (periods.iloc[1:].to_numpy() == periods.iloc[:-1].to_numpy()))
+    assert (np.diff(numbers) >= 0).all()
+
+
+def test_weeks_start_on_monday(dates):
+    numbers = bucket_numbers(dates, 'Week')
+    labels = bucket_labels(numbers, 'Week')
+    starts = dates.dt.to_period('W-SUN').dt.start_time
+    assert (starts.dt.dayofweek == 0).all()
+    assert list(labels) == list('Week of ' + starts.dt.strftime('%Y-%m-%d'))
+
+
+def test_quarter_labels(dates):
+    labels = bucket_labels(bucket_numbers(dates, 'Quarter'), 'Quarter')
+    periods = dates.dt.to_period('Q')
+    assert list(labels) == [f'{period.year} Q{period.quarter}' for period in periods]
+
+
+@pytest.mark.parametrize('date,week,quarter', [
+    ('2016-12-31', 'Week of 2016-12-26', '2016 Q4'),
+    ('2017-01-01', 'Week of 2016-12-26', '2017 Q1'),
+    ('2017-01-02', 'Week of 2017-01-02', '2017 Q1'),
+    ('2016-03-31', 'Week of 2016-03-28', '2016 Q1'),
+    ('2016-04-01', 'Week of 2016-03-28', '2016 Q2'),
+    ('1969-12-31', 'Week of 1969-12-29', '1969 Q4'),
+])
+def test_bucket_boundaries(date, week, quarter):
+    dates = [pd.Timestamp(date)]
+    assert list(bucket_labels(bucket_numbers(dates, 'Week'), 'Week')) == [week]
+    assert list(bucket_labels(bucket_numbers(dates, 'Quarter'), 'Quarter')) == [quarter]
+
+
+def test_missing_dates_get_the_trailing_code():
+    buckets = TimeBuckets(pd.Series(pd.to_datetime(['2016-01-05', None, '2016-03-01'])), 'Month')
+    assert buckets.n == 3 and list(buckets.codes) == [0, 3, 2] and buckets.missing == 1
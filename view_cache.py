@@ -0,0 +1,39 @@
+"""Per-session memo for views that are only built on demand.
+
+Expander contents and download payloads are built the first time they are
+needed and then reused until the filter state changes. Only the views of the
+current filter state are kept, so a session never holds more than one set.
+"""
+
+import hashlib
+import threading
+
+import numpy as np
+
+
+def filter_key(digest, window, region, state, city):
+    """Hashable key of the active filter state."""
+    if isinstance(window, slice):
+        rows = (window.start, window.stop)
+    else:
+        rows = hashlib.blake2b(np.ascontiguousarray(window).tobytes(), digest_size=16).hexdigest()
+    return (digest, rows, tuple(region), tuple(state), tuple(city))
+
+
+class ViewCache:
+
+    def __init__(self):
+        self.key = None
+        self.values = {}
+        # download callables run on a separate thread from the script
+        self._lock = threading.Lock()
+
+    def get(self, key, name, build):
+        """Return the view cached as name for key, building it with build() once."""
+        with self._lock:
+            if key != self.key:
+                self.key = key
+                self.values = {}
+            if name not in self.values:
+                self.values[name] = build()
+            return self.values[name]